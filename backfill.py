@@ -0,0 +1,204 @@
+"""Re-clean exported channel history in bulk.
+
+Usage: python backfill.py INPUT.jsonl OUTPUT.jsonl [--workers N] [--batch-size N] [--resolve] [--scrape]
+
+Each input line is a JSON message with a "text" (or "caption") field, either a
+string or a Telegram export list of text parts. Each output line carries the
+message id, the prices and PIN found in it, and per link the clean URL, the
+cleaned title and the reply the bot would send. By default nothing touches the
+network; --resolve unshortens links and --scrape fetches product pages for
+messages that carry no usable title of their own.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, List, Dict, Iterator, Iterable
+
+from bot import URLResolver, TitleCleaner, ReviewCheckkBot
+from retailers import analyze_url, URLAnalysis
+from message_parser import parse_message
+
+logger = logging.getLogger(__name__)
+
+
+def record_text(record: Dict) -> str:
+    """Message text from a JSONL record, flattening Telegram export text parts"""
+    text = record.get('text') or record.get('caption') or ''
+    if isinstance(text, list):
+        text = ''.join(part if isinstance(part, str) else part.get('text', '') for part in text)
+    return text
+
+
+def iter_records(path: str) -> Iterator[Dict]:
+    """Stream records from a JSONL file, skipping blank and malformed lines"""
+    with open(path, encoding='utf-8') as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                logger.warning(f"Skipping malformed line {line_no}: {e}")
+
+
+def iter_batches(records: Iterable[Dict], batch_size: int) -> Iterator[List[Dict]]:
+    """Group records into lists of at most batch_size"""
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def is_confident(analysis: Optional[URLAnalysis]) -> bool:
+    """Whether the URL alone names the product well enough to skip scraping"""
+    return analysis is not None and analysis.confidence >= ReviewCheckkBot.FAST_PATH_CONFIDENCE
+
+
+def clean_record(record: Dict) -> Dict:
+    """Run the offline cleaning pipeline over one message"""
+    parsed = parse_message(record_text(record))
+    resolved = record.get('resolved', {})
+    scraped = record.get('scraped', {})
+
+    result = {
+        'id': record.get('id'),
+        'prices': parsed.price_values,
+        'pin': parsed.pin,
+        'links': [],
+    }
+
+    forwarded_title = ReviewCheckkBot.forwarded_clean_title(parsed)
+    for url in parsed.urls:
+        resolved_url = resolved.get(url) or URLResolver.clean_url(url)
+        analysis = analyze_url(resolved_url)
+        final_url = analysis.canonical_url if analysis is not None else resolved_url
+        clean_title = forwarded_title
+        if not clean_title and is_confident(analysis):
+            clean_title = TitleCleaner.clean_title(analysis.title)
+        if not clean_title and scraped.get(resolved_url):
+            clean_title = TitleCleaner.clean_title(scraped[resolved_url])
+        if not clean_title:
+            clean_title = ReviewCheckkBot.fallback_clean_title(final_url, parsed, analysis)
+        result['links'].append({
+            'url': url,
+            'clean_url': final_url,
+            'title': clean_title,
+            'reply': ReviewCheckkBot.build_reply(final_url, parsed, clean_title, analysis),
+        })
+    return result
+
+
+def clean_batch(records: List[Dict]) -> List[Dict]:
+    """Worker entry point: clean a batch, isolating failures per record"""
+    results = []
+    for record in records:
+        try:
+            results.append(clean_record(record))
+        except Exception as e:
+            results.append({'id': record.get('id'), 'error': str(e)})
+    return results
+
+
+async def fetch_network(batch: List[Dict], client, cache, resolve: bool, scrape: bool, concurrency: int):
+    """Attach unshortened URLs and scraped raw titles to each record in the batch"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def resolve_url(url: str) -> str:
+        if not URLResolver.is_shortener(url):
+            return URLResolver.clean_url(url)
+        async with semaphore:
+            return await URLResolver.unshorten_url(url, client, cache)
+
+    async def scrape_url(url: str) -> Optional[str]:
+        async with semaphore:
+            return await TitleCleaner.extract_title_from_url(url, client)
+
+    for record in batch:
+        parsed = parse_message(record_text(record))
+        urls = parsed.urls
+        if not urls:
+            continue
+        if resolve:
+            finals = await asyncio.gather(*(resolve_url(url) for url in urls))
+            record['resolved'] = dict(zip(urls, finals))
+        if scrape and not ReviewCheckkBot.forwarded_clean_title(parsed):
+            finals = [record.get('resolved', {}).get(url) or URLResolver.clean_url(url) for url in urls]
+            finals = [url for url in finals if not is_confident(analyze_url(url))]
+            titles = await asyncio.gather(*(scrape_url(url) for url in finals))
+            record['scraped'] = {url: title for url, title in zip(finals, titles) if title}
+
+
+async def backfill(input_path: str, output_path: str, workers: Optional[int] = None, batch_size: int = 500,
+                   resolve: bool = False, scrape: bool = False, concurrency: int = 20) -> Dict[str, float]:
+    """Clean every message in input_path into output_path, keeping input order"""
+    loop = asyncio.get_running_loop()
+    client = cache = None
+    if resolve or scrape:
+        from http_client import HTTPClient
+        from cache import TieredCache
+        client = HTTPClient.from_env()
+        cache = TieredCache.from_env('resolved_urls', ttl=7 * 86400)
+
+    workers = workers or os.cpu_count() or 1
+    stats = {'messages': 0, 'links': 0, 'errors': 0}
+    started = time.monotonic()
+
+    def write(results: List[Dict], out):
+        for result in results:
+            stats['messages'] += 1
+            stats['links'] += len(result.get('links', []))
+            stats['errors'] += 'error' in result
+            out.write(json.dumps(result, ensure_ascii=False) + '\n')
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool, open(output_path, 'w', encoding='utf-8') as out:
+            # At most two batches per worker in flight keeps memory flat on any input size
+            max_pending = 2 * workers
+            pending = deque()
+            for batch in iter_batches(iter_records(input_path), batch_size):
+                if client is not None:
+                    await fetch_network(batch, client, cache, resolve, scrape, concurrency)
+                pending.append(loop.run_in_executor(pool, clean_batch, batch))
+                if len(pending) >= max_pending:
+                    write(await pending.popleft(), out)
+            while pending:
+                write(await pending.popleft(), out)
+    finally:
+        if client is not None:
+            await client.close()
+            cache.close()
+
+    stats['seconds'] = time.monotonic() - started
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('input', help='JSONL file of exported messages')
+    parser.add_argument('output', help='JSONL file to write cleaned results to')
+    parser.add_argument('--workers', type=int, default=None, help='cleaning processes (default: CPU count)')
+    parser.add_argument('--batch-size', type=int, default=500, help='messages per worker task')
+    parser.add_argument('--resolve', action='store_true', help='unshorten links over the network')
+    parser.add_argument('--scrape', action='store_true', help='scrape titles for messages without one')
+    parser.add_argument('--concurrency', type=int, default=20, help='parallel network requests')
+    args = parser.parse_args()
+
+    stats = asyncio.run(backfill(args.input, args.output, args.workers, args.batch_size,
+                                 args.resolve, args.scrape, args.concurrency))
+    logger.info(f"Backfilled {stats['messages']} messages ({stats['links']} links, {stats['errors']} errors) "
+                f"in {stats['seconds']:.1f}s, {stats['messages'] / max(stats['seconds'], 1e-9):.0f} msg/s")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,213 @@
+"""End-to-end benchmark of ReviewCheckkBot against the local stand-in.
+
+Usage: python benchmarks/bench_e2e.py [--concurrency 1,4,16] [--messages N]
+                                      [--latency MS] [--jitter MS] [--error-rate P]
+                                      [--rate-limit] [--output results.json]
+
+Fake Telegram updates are pushed through handle_message by N concurrent
+senders; each message counts as done once it has received a reply per link.
+Every concurrency level gets a fresh bot with empty in-memory caches.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+import itertools
+import subprocess
+from types import SimpleNamespace
+from typing import Dict, Iterator, List, Optional
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+# Keep the benchmark off the on-disk cache so runs start cold and comparable
+os.environ['CACHE_DB_PATH'] = ''
+# Telegram's flood limits would cap the benchmark at the send rate instead of the bot's throughput
+os.environ.setdefault('SEND_GLOBAL_RATE', '1000000')
+os.environ.setdefault('SEND_CHAT_RATE', '1000000')
+
+from bot import ReviewCheckkBot, URLResolver  # noqa: E402
+from http_client import HTTPClient  # noqa: E402
+from rate_limit import DomainRateLimiter  # noqa: E402
+from standin import StandInServer, StandInResolver, FIXTURES  # noqa: E402
+
+
+class FakeMessage:
+    """Just enough of telegram.Message for handle_message and the reply path"""
+
+    def __init__(self, message_id: int, text: str, chat_type: str = 'private'):
+        self.message_id = message_id
+        self.text = text
+        self.caption = None
+        self.photo = None
+        self.forward_date = None
+        self.forward_from = None
+        self.chat = SimpleNamespace(id=message_id % 1000, type=chat_type)
+        self.chat_id = self.chat.id
+        self.replies: List[str] = []
+        self.expected = len(URLResolver.detect_links(text))
+        self.done = asyncio.Event()
+
+    def record(self, text: str):
+        self.replies.append(text)
+        if len(self.replies) >= self.expected:
+            self.done.set()
+
+    async def reply_text(self, text: str, **kwargs):
+        self.record(text)
+
+    async def reply_photo(self, photo=None, caption: str = '', **kwargs):
+        self.record(caption)
+
+
+def fake_update(message: FakeMessage) -> SimpleNamespace:
+    """Update wrapper exposing the message the way handle_message reads it"""
+    return SimpleNamespace(effective_message=message, message=message)
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile of an unsorted list"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(q * len(ordered))) - 1))]
+
+
+def latency_summary(latencies: List[float]) -> Dict[str, float]:
+    """p50/p95/p99 and max in milliseconds"""
+    return {
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'max_ms': max(latencies) * 1000 if latencies else 0.0,
+    }
+
+
+def build_bot(standin: StandInServer, rate_limit: bool) -> ReviewCheckkBot:
+    """A bot whose HTTP client resolves every host to the stand-in"""
+    bot = ReviewCheckkBot('0:benchmark')
+    limiter = DomainRateLimiter() if rate_limit else DomainRateLimiter({}, default_limit=(1e9, 10 ** 9))
+    bot.http = HTTPClient(rate_limiter=limiter, resolver=StandInResolver(standin.port))
+    return bot
+
+
+async def drive(bot: ReviewCheckkBot, texts: Iterator[str], count: int, concurrency: int,
+                timeout: float) -> Dict[str, float]:
+    """Send count messages through handle_message with concurrency closed-loop senders"""
+    latencies: List[float] = []
+    incomplete = 0
+    replies = 0
+    ids = itertools.count(1)
+    remaining = [count]
+
+    async def sender():
+        nonlocal incomplete, replies
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            message = FakeMessage(next(ids), next(texts))
+            started = time.perf_counter()
+            await bot.handle_message(fake_update(message), None)
+            try:
+                await asyncio.wait_for(message.done.wait(), timeout)
+            except asyncio.TimeoutError:
+                incomplete += 1
+            latencies.append(time.perf_counter() - started)
+            replies += len(message.replies)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(sender() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    result = {
+        'concurrency': concurrency,
+        'messages': count,
+        'replies': replies,
+        'incomplete': incomplete,
+        'seconds': elapsed,
+        'msgs_per_sec': count / elapsed if elapsed else 0.0,
+    }
+    result.update(latency_summary(latencies))
+    return result
+
+
+def git_revision() -> Optional[str]:
+    """Short commit hash of the tree being benchmarked, if available"""
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCH_DIR,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args) -> Dict:
+    with open(args.fixtures) as f:
+        messages = json.load(f)['messages']
+
+    standin = StandInServer(latency=args.latency / 1000, jitter=args.jitter / 1000,
+                            error_rate=args.error_rate, fixtures=args.fixtures, seed=args.seed)
+    await standin.start()
+    levels = []
+    try:
+        for concurrency in args.concurrency:
+            bot = build_bot(standin, args.rate_limit)
+            await bot.startup(bot.application)
+            try:
+                result = await drive(bot, itertools.cycle(messages), args.messages, concurrency,
+                                     bot.message_deadline + 5)
+            finally:
+                await bot.shutdown(bot.application)
+            levels.append(result)
+            print(f"c={concurrency:<4} {result['msgs_per_sec']:8.1f} msg/s  p50={result['p50_ms']:7.1f}ms "
+                  f"p95={result['p95_ms']:7.1f}ms  p99={result['p99_ms']:7.1f}ms  "
+                  f"incomplete={result['incomplete']}")
+    finally:
+        await standin.stop()
+
+    return {
+        'benchmark': 'e2e',
+        'revision': git_revision(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'config': {
+            'messages': args.messages,
+            'latency_ms': args.latency,
+            'jitter_ms': args.jitter,
+            'error_rate': args.error_rate,
+            'rate_limit': args.rate_limit,
+        },
+        'levels': levels,
+        'standin': standin.stats(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--concurrency', default='1,4,16',
+                        type=lambda value: [int(v) for v in value.split(',')],
+                        help='comma-separated concurrent sender counts')
+    parser.add_argument('--messages', type=int, default=200, help='messages per concurrency level')
+    parser.add_argument('--latency', type=float, default=50.0, help='stand-in response latency in ms')
+    parser.add_argument('--jitter', type=float, default=20.0, help='+/- latency jitter in ms')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of stand-in requests that 503')
+    parser.add_argument('--rate-limit', action='store_true', help='keep the production per-domain rate limits')
+    parser.add_argument('--fixtures', default=FIXTURES, help='stand-in fixtures with redirects and messages')
+    parser.add_argument('--seed', type=int, default=1, help='seed for latency jitter and errors')
+    parser.add_argument('--output', help='write results JSON here')
+    parser.add_argument('--verbose', action='store_true', help='keep the bot warnings')
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.ERROR)
+
+    results = asyncio.run(run(args))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
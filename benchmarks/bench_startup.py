@@ -0,0 +1,131 @@
+"""Measure cold-start cost: module import time and time to the first processed update.
+
+Usage: python benchmarks/bench_startup.py [--runs N] [--top N] [--output results.json]
+
+Each run starts a fresh interpreter that imports bot, builds ReviewCheckkBot
+and pushes one fake update through handle_message. The message carries its
+own title and a retailer URL, so it is answered without touching the network.
+Times are measured from just before the child process is spawned. A separate
+`python -X importtime -c "import bot"` run lists the slowest imports.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+from typing import Dict, List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+
+MESSAGE_TEXT = (
+    "boAt Airdopes 141 Bluetooth Truly Wireless Earbuds\n"
+    "Deal price ₹999\n"
+    "https://www.amazon.in/boAt-Airdopes-141-Bluetooth-Wireless/dp/B09N3ZNHTY?tag=deals-21"
+)
+
+
+async def first_update(spawned_at: float) -> Dict[str, float]:
+    """Child process: import, build the bot and answer one update, timing each step"""
+    import asyncio
+    from types import SimpleNamespace
+
+    imported_at = time.time()
+    from bot import ReviewCheckkBot
+    imported = time.time()
+
+    bot = ReviewCheckkBot('0:startup-benchmark')
+    await bot.startup(bot.application)
+    built = time.time()
+
+    replied = asyncio.Event()
+
+    class FakeMessage(SimpleNamespace):
+        async def reply_text(self, text: str, **kwargs):
+            replied.set()
+
+    message = FakeMessage(
+        message_id=1, chat_id=1, chat=SimpleNamespace(id=1, type='private'), text=MESSAGE_TEXT,
+        caption=None, photo=None, forward_date=None, forward_from=None,
+    )
+    await bot.handle_message(SimpleNamespace(effective_message=message, message=message), None)
+    await replied.wait()
+    answered = time.time()
+    await bot.shutdown(bot.application)
+
+    return {
+        'interpreter_s': imported_at - spawned_at,
+        'import_s': imported - imported_at,
+        'init_s': built - imported,
+        'first_update_s': answered - built,
+        'total_s': answered - spawned_at,
+    }
+
+
+def run_child() -> Dict[str, float]:
+    """Spawn one cold interpreter and collect its timings"""
+    env = dict(os.environ, CACHE_DB_PATH='', PYTHONDONTWRITEBYTECODE='1')
+    spawned_at = time.time()
+    out = subprocess.run(
+        [sys.executable, __file__, '--child', repr(spawned_at)],
+        cwd=REPO_DIR, env=env, capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def slowest_imports(top: int) -> List[Dict]:
+    """Modules with the largest cumulative import time when importing bot"""
+    err = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import bot'],
+        cwd=REPO_DIR, capture_output=True, text=True, check=True,
+    ).stderr
+    rows = []
+    for line in err.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        rows.append({'module': name.strip(), 'self_ms': int(self_us) / 1000,
+                     'cumulative_ms': int(cumulative_us) / 1000})
+    return sorted(rows, key=lambda row: row['cumulative_ms'], reverse=True)[:top]
+
+
+def median(values: List[float]) -> float:
+    ordered = sorted(values)
+    return ordered[len(ordered) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5, help='cold starts to measure, the median is reported')
+    parser.add_argument('--top', type=int, default=15, help='slowest imports to list')
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    parser.add_argument('--child', type=float, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        import asyncio
+        import logging
+        logging.disable(logging.CRITICAL)
+        sys.path.insert(0, REPO_DIR)
+        print(json.dumps(asyncio.run(first_update(args.child))))
+        return
+
+    runs = [run_child() for _ in range(args.runs)]
+    summary = {key: median([run[key] for run in runs]) * 1000 for key in runs[0]}
+    imports = slowest_imports(args.top)
+
+    print(f"Cold start over {args.runs} runs (median ms):")
+    for key, value in summary.items():
+        print(f"  {key[:-2]:<15} {value:8.1f}")
+    print("\nSlowest imports under `import bot`:")
+    for row in imports:
+        print(f"  {row['cumulative_ms']:8.1f} ms  {row['self_ms']:7.1f} ms self  {row['module']}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'startup_ms': summary, 'imports': imports, 'runs': runs}, f, indent=2)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
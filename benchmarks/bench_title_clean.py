@@ -0,0 +1,52 @@
+"""Check TitleCleaner.clean_title against the golden corpus and measure titles/sec.
+
+Usage: python benchmarks/bench_title_clean.py [--corpus FILE] [--rounds N]
+
+The corpus is a JSON list of {"raw": ..., "clean": ...} pairs. Any change to
+the cleaner must keep every "clean" value identical.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot import TitleCleaner  # noqa: E402
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'title_corpus.json')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--corpus', default=CORPUS, help='golden corpus JSON file')
+    parser.add_argument('--rounds', type=int, default=50, help='passes over the corpus to time')
+    args = parser.parse_args()
+
+    with open(args.corpus, encoding='utf-8') as f:
+        corpus = json.load(f)
+
+    mismatches = 0
+    for entry in corpus:
+        actual = TitleCleaner.clean_title(entry['raw'])
+        if actual != entry['clean']:
+            mismatches += 1
+            print(f"MISMATCH {entry['raw']!r}: expected {entry['clean']!r}, got {actual!r}")
+
+    titles = [entry['raw'] for entry in corpus]
+    start = time.perf_counter()
+    for _ in range(args.rounds):
+        for title in titles:
+            TitleCleaner.clean_title(title)
+    elapsed = time.perf_counter() - start
+
+    count = len(titles) * args.rounds
+    print(f"{len(corpus)} golden titles, {mismatches} mismatches")
+    print(f"{count} titles in {elapsed:.3f}s: {count / elapsed:,.0f} titles/sec "
+          f"({elapsed / count * 1e6:.1f} us/title)")
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
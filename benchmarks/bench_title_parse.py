@@ -0,0 +1,71 @@
+"""Compare the lxml title extraction path against the BeautifulSoup one on saved pages.
+
+Usage: python benchmarks/bench_title_parse.py [--pages DIR] [--repeat N]
+
+DIR holds saved product pages plus an index.json mapping each file name to
+the URL it was saved from (the domain picks the site-specific selectors).
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from urllib.parse import urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot import TitleCleaner  # noqa: E402
+from html_title import extract_title_candidates  # noqa: E402
+
+PAGES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pages')
+
+
+def time_call(fn, repeat: int) -> float:
+    """Best-of-N wall time of fn in milliseconds"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pages', default=PAGES_DIR, help='directory of saved pages with an index.json')
+    parser.add_argument('--repeat', type=int, default=20, help='runs per page, best time is reported')
+    args = parser.parse_args()
+
+    with open(os.path.join(args.pages, 'index.json')) as f:
+        index = json.load(f)
+
+    mismatches = 0
+    total_soup = total_fast = 0.0
+    print(f"{'page':<28}{'KB':>8}{'soup ms':>10}{'lxml ms':>10}{'speedup':>9}  agree")
+    for name, url in sorted(index.items()):
+        with open(os.path.join(args.pages, name), 'rb') as f:
+            content = f.read()
+        domain = urlparse(url).netloc.lower()
+
+        agree = True
+        for deep in (False, True):
+            expected = TitleCleaner.soup_title_candidates(content, url, deep)
+            actual = extract_title_candidates(content, domain, deep)
+            if expected != actual:
+                agree = False
+                print(f"  {name} deep={deep}: soup={expected!r} lxml={actual!r}")
+        mismatches += not agree
+
+        soup_ms = time_call(lambda: TitleCleaner.soup_title_candidates(content, url), args.repeat)
+        fast_ms = time_call(lambda: extract_title_candidates(content, domain), args.repeat)
+        total_soup += soup_ms
+        total_fast += fast_ms
+        print(f"{name:<28}{len(content) / 1024:>8.1f}{soup_ms:>10.2f}{fast_ms:>10.2f}"
+              f"{soup_ms / fast_ms:>8.1f}x  {'yes' if agree else 'NO'}")
+
+    print(f"{'total':<28}{'':>8}{total_soup:>10.2f}{total_fast:>10.2f}{total_soup / total_fast:>8.1f}x")
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
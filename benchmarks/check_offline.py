@@ -0,0 +1,521 @@
+"""Offline regression checks for code paths the benchmarks do not exercise.
+
+Usage: python benchmarks/check_offline.py [--verbose]
+
+Each check drives one piece of the bot with in-process fakes, no network,
+Telegram or Redis needed, and reports what went wrong. Exits non-zero if
+any check fails.
+"""
+import os
+import sys
+import time
+import asyncio
+import logging
+import argparse
+import sqlite3
+import tempfile
+import threading
+from types import SimpleNamespace
+from typing import Callable, Dict, List, Optional
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+# Nothing here should touch the on-disk cache
+os.environ['CACHE_DB_PATH'] = ''
+
+import ocr  # noqa: E402
+from bot import ReviewCheckkBot, TitleCleaner, URLResolver  # noqa: E402
+from circuit_breaker import BlockedPage  # noqa: E402
+from cache import RedisCache, TieredCache  # noqa: E402
+from http_client import HTTPClient  # noqa: E402
+from job_broker import RedisBroker, SQLiteBroker  # noqa: E402
+from job_queue import PRIORITY_NAMES  # noqa: E402
+from message_parser import parse_message  # noqa: E402
+from metrics import Metrics  # noqa: E402
+from rate_limit import DomainRateLimiter  # noqa: E402
+from send_queue import SendScheduler  # noqa: E402
+from standin import StandInServer, StandInResolver  # noqa: E402
+
+
+class FakeStream:
+    """response.content that hands out a body in fixed-size chunks"""
+
+    def __init__(self, body: bytes, chunk_size: int):
+        self.chunks = [body[i:i + chunk_size] for i in range(0, len(body), chunk_size)]
+
+    async def iter_chunked(self, size: int):
+        # Like aiohttp, chunks come off the stream once and are never handed out again
+        while self.chunks:
+            yield self.chunks.pop(0)
+
+
+async def check_read_body_keeps_every_byte() -> List[str]:
+    """A head read followed by a deep read returns the body without holes"""
+    failures = []
+    head = b'<html><head><title>x</title>' + b'<meta name="a" content="b">' * 8000
+    body = head + b'</head><body>' + b'<p>product</p>' * 4000 + b'</body></html>'
+    for chunk_size in (1000, 10 * 1024, 16 * 1024):
+        response = SimpleNamespace(content=FakeStream(body, chunk_size))
+        content = await TitleCleaner.read_body(response, TitleCleaner.HEAD_BYTE_CAP, TitleCleaner.HEAD_END)
+        content += await TitleCleaner.read_body(response, TitleCleaner.BODY_BYTE_CAP - len(content))
+        if content != body:
+            failures.append(f"{chunk_size} byte chunks: {len(body)} bytes in, {len(content)} out")
+    return failures
+
+
+async def check_slug_title_survives_scrape_miss() -> List[str]:
+    """Low-confidence retailer slugs still title the reply when the scrape finds nothing"""
+    failures = []
+    bot = ReviewCheckkBot('0:check')
+
+    async def scrape_miss(url, page=None, page_url=None):
+        return ''
+
+    bot.scrape_clean_title = scrape_miss
+    for url in ('https://www.amazon.in/boAt-Airdopes/dp/B09N3ZNHTY',
+                'https://www.flipkart.com/boat-airdopes/p/itm6f3b1c2d3e4f5?pid=ACCG2YHZ8QXYZABC'):
+        reply = await bot.process_url(url, parse_message(url))
+        if not reply or 'Airdopes' not in reply:
+            failures.append(f"{url}: {reply!r}")
+    return failures
+
+
+async def check_failed_unshorten_not_cached() -> List[str]:
+    """A short link that ends on an error is retried next time, a resolved one is cached"""
+    failures = []
+    standin = StandInServer(pages_dir=None, fixtures=None)
+    standin.add_page('http://amzn.to/limited', b'<html><head><title>Too Many Requests</title></head></html>', 429)
+    standin.add_redirect('http://amzn.to/fine', 'http://www.amazon.in/boAt-Airdopes-141/dp/B09N3ZNHTY?tag=x')
+    await standin.start()
+    client = HTTPClient(rate_limiter=DomainRateLimiter({}, default_limit=(1e9, 10 ** 9)),
+                        resolver=StandInResolver(standin.port))
+    cache = TieredCache('resolved_urls')
+    try:
+        for _ in range(2):
+            await URLResolver.resolve('http://amzn.to/limited', client, cache)
+        if standin.requests != 2 or cache.get('http://amzn.to/limited') is not None:
+            failures.append(f"rate-limited short link cached: {standin.requests} server hits, "
+                            f"cached {cache.get('http://amzn.to/limited')!r}")
+        resolved = await URLResolver.resolve('http://amzn.to/fine', client, cache)
+        if not resolved.complete or cache.get('http://amzn.to/fine') != resolved.url:
+            failures.append(f"resolved short link not cached: {resolved!r}")
+    finally:
+        await client.close()
+        await standin.stop()
+    return failures
+
+
+async def check_interstitial_title_not_cached() -> List[str]:
+    """The head of a meta refresh interstitial never becomes the product's title"""
+    failures = []
+    standin = StandInServer(pages_dir=None, fixtures=None)
+    standin.add_page('http://bit.ly/earnDeal', b'<html><head><title>EarnKaro - Share deals and earn</title>'
+                     b'<meta http-equiv="refresh" content="0;url=http://www.amazon.in/dp/B09N3ZNHTY"></head></html>')
+    standin.add_page('http://www.amazon.in/dp/B09N3ZNHTY', b'<html><head><title>boAt Airdopes 141 Bluetooth '
+                     b'Truly Wireless Earbuds : Amazon.in: Electronics</title></head><body></body></html>')
+    await standin.start()
+    bot = ReviewCheckkBot('0:check')
+    bot.http = HTTPClient(rate_limiter=DomainRateLimiter({}, default_limit=(1e9, 10 ** 9)),
+                          resolver=StandInResolver(standin.port))
+    try:
+        reply = await bot.process_url('http://bit.ly/earnDeal', parse_message('http://bit.ly/earnDeal'))
+        cached = bot.title_cache.get('amazon:B09N3ZNHTY') or ''
+        if 'Earbuds' not in (reply or '') or 'earnkaro' in cached.lower():
+            failures.append(f"interstitial title used: reply {reply!r}, cached {cached!r}")
+    finally:
+        await bot.http.close()
+        await standin.stop()
+    return failures
+
+
+async def check_blocked_pages_only() -> List[str]:
+    """Only CAPTCHA and bot check pages count as blocks, not titles that merely look like errors"""
+    failures = []
+    for title in ('Terror Tees Oversized Graphic T-Shirt', 'Lenovo IdeaPad 3 15ITL6 403 Laptop',
+                  'Error Free Water Bottle 1L'):
+        try:
+            TitleCleaner.check_blocked([title], b'<html></html>', 'https://www.example-shop.in/p/1')
+        except BlockedPage:
+            failures.append(f"{title!r} counted as a block page")
+    for title, content in (('Amazon.in Robot Check', b''), ('Flipkart', b'<div class="g-recaptcha"></div>')):
+        try:
+            TitleCleaner.check_blocked([title], content, 'https://www.example-shop.in/p/1')
+            failures.append(f"{title!r} not counted as a block page")
+        except BlockedPage:
+            pass
+    return failures
+
+
+class OutboxMessage:
+    """A chat message that records the replies sent to it"""
+
+    def __init__(self, chat_id: int, message_id: int, delay: float = 0.0):
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.photo = None
+        self.delay = delay
+        self.replies: List[str] = []
+
+    async def reply_text(self, text: str, **kwargs):
+        await asyncio.sleep(self.delay)
+        self.replies.append(text)
+
+
+async def check_outbox_merges_per_message() -> List[str]:
+    """Merged replies stay under their own message, and a cancelled drain resolves every future"""
+    failures = []
+    sender = SendScheduler(global_rate=1e6, private_rate=1e6, group_rate=1e6, merge_window=0.02)
+    first, second = OutboxMessage(-100, 1), OutboxMessage(-100, 2)
+    await asyncio.gather(sender.submit(first, 'a1'), sender.submit(second, 'b1'), sender.submit(first, 'a2'),
+                         sender.submit(second, 'b2'), sender.submit(second, 'b3'))
+    if first.replies != ['a1', 'a2'] or second.replies != ['b1', 'b2\n\nb3']:
+        failures.append(f"replies mixed across messages: {first.replies} {second.replies}")
+
+    slow = OutboxMessage(1, 3, delay=5.0)
+    futures = [sender.submit(slow, text) for text in ('c1', 'c2', 'c3')]
+    await asyncio.sleep(0.1)
+    await sender.close()
+    pending = sum(1 for future in futures if not future.done())
+    if pending:
+        failures.append(f"{pending} of {len(futures)} futures left pending after close")
+    return failures
+
+
+async def check_handler_does_not_wait_on_sends() -> List[str]:
+    """handle_message queues its error replies instead of waiting out the chat's send limits"""
+    failures = []
+    bot = ReviewCheckkBot('0:check')
+    bot.ocr.workers = 0
+    photo = OutboxMessage(1, 1, delay=5.0)
+    photo.photo, photo.text, photo.caption, photo.forward_from = ['photo'], None, None, None
+    broken = OutboxMessage(1, 2, delay=5.0)
+
+    def unreadable(message):
+        raise ValueError('unreadable')
+
+    for name, message in (('photo without OCR', photo), ('handler error', broken)):
+        if message is broken:
+            bot.extract_text = unreadable
+        started = time.monotonic()
+        await bot.handle_message(SimpleNamespace(effective_message=message), None)
+        if time.monotonic() - started > 1:
+            failures.append(f"{name}: handler waited {time.monotonic() - started:.1f}s on the reply")
+    if bot.sender.queued != 2:
+        failures.append(f"{bot.sender.queued} replies queued, expected 2")
+    await bot.sender.close()
+    return failures
+
+
+def slow_ocr(data: bytes) -> str:
+    """Stand-in for ocr_image that takes longer than the OCR timeout"""
+    time.sleep(0.5)
+    return 'late'
+
+
+async def check_ocr_timeout_keeps_slot() -> List[str]:
+    """An image that timed out holds its slot until the worker is really done with it"""
+    failures = []
+    photo_ocr = ocr.PhotoOCR(TieredCache('photo_text'), workers=1, max_pending=2, timeout=0.05)
+    ocr_image, ocr.ocr_image = ocr.ocr_image, slow_ocr
+    try:
+        results = await asyncio.gather(*(photo_ocr.run(b'') for _ in range(2)), return_exceptions=True)
+        if not all(isinstance(result, asyncio.TimeoutError) for result in results):
+            failures.append(f"expected two timeouts, got {results!r}")
+        if photo_ocr.pending != 2 or not photo_ocr.slots.locked():
+            failures.append(f"slots freed while Tesseract still runs: pending={photo_ocr.pending}")
+        deadline = time.monotonic() + 5
+        while photo_ocr.pending and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        if photo_ocr.pending or photo_ocr.slots.locked():
+            failures.append(f"slots not freed after the workers finished: pending={photo_ocr.pending}")
+    finally:
+        ocr.ocr_image = ocr_image
+        photo_ocr.close()
+    return failures
+
+
+class FakeRedis:
+    """In-process stand-in for the redis.Redis calls RedisCache and RedisBroker make"""
+
+    def __init__(self):
+        self.lists: Dict[str, List[bytes]] = {}
+        self.values: Dict[str, bytes] = {}
+        self.expiry: Dict[str, float] = {}
+        self.changed = threading.Condition()
+
+    def ping(self):
+        return True
+
+    def close(self):
+        pass
+
+    def pipeline(self, transaction: bool = True) -> 'FakePipeline':
+        return FakePipeline(self)
+
+    def lpush(self, key: str, value) -> int:
+        with self.changed:
+            self.lists.setdefault(key, []).insert(0, value.encode() if isinstance(value, str) else value)
+            self.changed.notify_all()
+            return len(self.lists[key])
+
+    def llen(self, key: str) -> int:
+        return len(self.lists.get(key, []))
+
+    def brpop(self, keys: List[str], timeout: int = 0):
+        """Pop from the first non-empty list in key order, waiting up to timeout seconds"""
+        deadline = time.monotonic() + timeout
+        with self.changed:
+            while True:
+                for key in keys:
+                    if self.lists.get(key):
+                        return key.encode(), self.lists[key].pop()
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self.changed.wait(remaining)
+
+    def live(self, key: str) -> bool:
+        if key in self.expiry and self.expiry[key] <= time.monotonic():
+            del self.values[key], self.expiry[key]
+        return key in self.values
+
+    def set(self, key: str, value: bytes, px: Optional[int] = None):
+        self.values[key] = value
+        if px is not None:
+            self.expiry[key] = time.monotonic() + px / 1000
+        else:
+            self.expiry.pop(key, None)
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.values[key] if self.live(key) else None
+
+    def pttl(self, key: str) -> int:
+        if not self.live(key):
+            return -2
+        if key not in self.expiry:
+            return -1
+        return int((self.expiry[key] - time.monotonic()) * 1000)
+
+    def delete(self, key: str) -> int:
+        existed = self.live(key)
+        self.values.pop(key, None)
+        self.expiry.pop(key, None)
+        return int(existed)
+
+
+class FakePipeline:
+    """Queues FakeRedis calls and runs them on execute()"""
+
+    def __init__(self, client: FakeRedis):
+        self.client = client
+        self.calls = []
+
+    def __getattr__(self, name: str):
+        def queue(*args, **kwargs):
+            self.calls.append((getattr(self.client, name), args, kwargs))
+            return self
+        return queue
+
+    def execute(self) -> List:
+        return [call(*args, **kwargs) for call, args, kwargs in self.calls]
+
+
+async def broker_order_failures(broker, name: str) -> List[str]:
+    """Push jobs of mixed priority and expect them back most urgent first, then oldest first"""
+    failures = []
+    jobs = [(priority, {'message_id': priority * 10 + n}) for n in range(3) for priority in sorted(PRIORITY_NAMES)]
+    for priority, job in jobs:
+        if not await broker.push(priority, job):
+            failures.append(f"{name}: push rejected below max_depth")
+    expected = sorted((job for _, job in jobs), key=lambda job: job['message_id'])
+    popped = [await broker.pop(0.1) for _ in jobs]
+    if popped != expected:
+        failures.append(f"{name}: popped {[job and job['message_id'] for job in popped]}, "
+                        f"expected {[job['message_id'] for job in expected]}")
+    if await broker.pop(0.1) is not None:
+        failures.append(f"{name}: pop from an empty broker returned a job")
+    for n in range(broker.max_depth):
+        await broker.push(0, {'message_id': n})
+    if await broker.push(0, {'message_id': -1}) or broker.stats()['depth'] != broker.max_depth:
+        failures.append(f"{name}: push past max_depth was accepted")
+    return failures
+
+
+async def check_broker_priority_order() -> List[str]:
+    """SQLite and Redis brokers hand out jobs by priority, oldest first, and cap their depth"""
+    failures = await broker_order_failures(RedisBroker('redis://fake', max_depth=10, client=FakeRedis()), 'redis')
+    with tempfile.TemporaryDirectory() as directory:
+        broker = SQLiteBroker(os.path.join(directory, 'jobs.db'), max_depth=10, poll_interval=0.01)
+        try:
+            failures += await broker_order_failures(broker, 'sqlite')
+        finally:
+            broker.close()
+    return failures
+
+
+class StalledRedis(FakeRedis):
+    """A server that takes half a second to answer anything"""
+
+    def lpush(self, key: str, value) -> int:
+        time.sleep(0.5)
+        return super().lpush(key, value)
+
+    def get(self, key: str) -> Optional[bytes]:
+        time.sleep(0.5)
+        return super().get(key)
+
+    def pipeline(self, transaction: bool = True) -> 'FakePipeline':
+        return StalledPipeline(self)
+
+
+class StalledPipeline(FakePipeline):
+    def execute(self) -> List:
+        time.sleep(0.5)
+        return super().execute()
+
+
+def lock_sqlite(path: str, seconds: float, held: threading.Event):
+    """Hold the write lock on a SQLite file from another connection, as a second process would"""
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute('BEGIN IMMEDIATE')
+    held.set()
+    time.sleep(seconds)
+    conn.execute('COMMIT')
+    conn.close()
+
+
+async def check_stalled_redis_keeps_loop_running() -> List[str]:
+    """Broker pushes and stats, shared cache reads and SQLite writes under another
+    process's lock wait in a thread, not on the event loop"""
+    failures = []
+    client = StalledRedis()
+    broker = RedisBroker('redis://fake', client=client)
+    cache = TieredCache('titles', backend=RedisCache('redis://fake', 'titles', client=client))
+    metrics = Metrics(enabled=True)
+    metrics.add_collector('broker', broker.stats, blocking=True)
+    db = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+    db.close()
+    local = TieredCache('urls', db.name)
+    held = threading.Event()
+    locker = threading.Thread(target=lock_sqlite, args=(db.name, 0.5, held))
+
+    async def locked_write():
+        locker.start()
+        held.wait()
+        await local.aset('key', 'value')
+    for name, call in (('push', broker.push(0, {'message_id': 1})), ('cache read', cache.aget('key')),
+                       ('broker stats', metrics.render()), ('sqlite write', locked_write())):
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticker = asyncio.create_task(tick())
+        await call
+        ticker.cancel()
+        if ticks < 20:
+            failures.append(f"{name}: event loop ran {ticks} ticks during a 0.5s stall")
+    locker.join()
+    if local.get('key') != 'value':
+        failures.append("sqlite write: lost after waiting on the lock")
+    local.close()
+    os.unlink(db.name)
+    return failures
+
+
+async def check_metrics_ports_per_process() -> List[str]:
+    """Processes sharing METRICS_PORT each bind their own port instead of dying"""
+    failures = []
+    endpoints = [Metrics(enabled=True, port=19464, port_span=4) for _ in range(3)]
+    try:
+        for metrics in endpoints:
+            await metrics.start()
+        ports = [metrics.port for metrics in endpoints]
+        if len(set(ports)) != len(ports) or any(metrics.runner is None for metrics in endpoints):
+            failures.append(f"endpoints bound ports {ports}")
+        crowded = Metrics(enabled=True, port=19464, port_span=3)
+        await crowded.start()
+        if crowded.runner is not None:
+            failures.append(f"bound port {crowded.port} already held by another endpoint")
+    except OSError as e:
+        failures.append(f"second endpoint failed to start: {e}")
+    finally:
+        for metrics in endpoints:
+            await metrics.stop()
+    return failures
+
+
+async def check_redis_cache_expiry() -> List[str]:
+    """The Redis tier stores, expires and promotes entries behind the memory tier"""
+    failures = []
+    client = FakeRedis()
+    shared = RedisCache('redis://fake', 'titles', ttl=60, client=client)
+    cache = TieredCache('titles', backend=shared)
+    await cache.aset('amazon:B09N3ZNHTY', 'boAt Airdopes 141')
+    await cache.aset('flipkart:SHORT', 'gone soon', ttl=0.05)
+
+    # A second process sees the first one's writes through the shared tier
+    other = TieredCache('titles', backend=RedisCache('redis://fake', 'titles', ttl=60, client=client))
+    if await other.aget('amazon:B09N3ZNHTY') != 'boAt Airdopes 141':
+        failures.append("value written by one cache not read back by another")
+    if other.memory.get('amazon:B09N3ZNHTY') is None:
+        failures.append("shared tier hit not promoted to the memory tier")
+    row = shared.get('amazon:B09N3ZNHTY')
+    if row is None or not 0 < row[1] - time.time() <= 60:
+        failures.append(f"expiry not carried over from the shared tier: {row!r}")
+
+    await asyncio.sleep(0.1)
+    if await other.aget('flipkart:SHORT') is not None or cache.get('flipkart:SHORT') is not None:
+        failures.append("entry still served after its ttl")
+    await cache.aget('missing')
+    if shared.stats()['misses'] < 1 or other.stats()['disk_hits'] != 1:
+        failures.append(f"hit/miss counters off: {shared.stats()} {other.stats()}")
+    return failures
+
+
+CHECKS: List[Callable] = [
+    check_read_body_keeps_every_byte,
+    check_slug_title_survives_scrape_miss,
+    check_failed_unshorten_not_cached,
+    check_interstitial_title_not_cached,
+    check_blocked_pages_only,
+    check_ocr_timeout_keeps_slot,
+    check_outbox_merges_per_message,
+    check_handler_does_not_wait_on_sends,
+    check_broker_priority_order,
+    check_stalled_redis_keeps_loop_running,
+    check_redis_cache_expiry,
+    check_metrics_ports_per_process,
+]
+
+
+async def run_checks() -> int:
+    failed = 0
+    for check in CHECKS:
+        failures = await check()
+        print(f"{'FAIL' if failures else 'ok  '} {check.__name__}")
+        for failure in failures:
+            print(f"       {failure}")
+        failed += bool(failures)
+    print(f"{len(CHECKS)} checks, {failed} failed")
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--verbose', action='store_true', help='keep the bot warnings')
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.ERROR)
+
+    return 1 if asyncio.run(run_checks()) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
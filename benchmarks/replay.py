@@ -0,0 +1,246 @@
+"""Replay captured production traffic against the local stand-in.
+
+Usage: python benchmarks/replay.py CAPTURE.jsonl.gz [CAPTURE ...] [--speedup 1,4,16]
+                                   [--latency MS] [--jitter MS] [--rate-limit]
+                                   [--baseline replies.json] [--save-replies replies.json]
+                                   [--output results.json]
+
+Capture logs come from running the bot with CAPTURE_PATH set (see capture.py).
+Recorded redirect hops and pages are loaded into the stand-in, https rewritten
+to http since it serves no TLS, and every captured message is replayed through
+process_url at its recorded offset divided by the speedup factor. Each speedup
+gets a fresh bot with empty in-memory caches. Replies are diffed against the
+ones in the log, or against --baseline replies saved from an earlier replay.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+from typing import Dict, List, Optional, Tuple
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+# Cold, comparable runs that do not capture the replay itself or wait on Telegram's flood limits
+os.environ['CACHE_DB_PATH'] = ''
+os.environ.pop('CAPTURE_PATH', None)
+os.environ.setdefault('SEND_GLOBAL_RATE', '1000000')
+os.environ.setdefault('SEND_CHAT_RATE', '1000000')
+
+from bot import ReviewCheckkBot, URLResolver  # noqa: E402
+from capture import MESSAGE, HOP, PAGE, REPLY, read_log, page_bytes  # noqa: E402
+from message_parser import parse_message  # noqa: E402
+from standin import StandInServer  # noqa: E402
+from bench_e2e import build_bot, latency_summary, git_revision  # noqa: E402
+
+
+def plain_http(text: Optional[str]) -> Optional[str]:
+    """Point https URLs at the stand-in's plain HTTP listener"""
+    return text.replace('https://', 'http://') if text else text
+
+
+def reply_key(record: Dict) -> str:
+    """Stable key for one link of one message"""
+    return f"{record['chat']}:{record['id']}:{record['i']}"
+
+
+class Capture:
+    """Messages, recorded replies and the stand-in routes read from capture logs"""
+
+    def __init__(self):
+        self.messages: List[Dict] = []
+        self.replies: Dict[str, Optional[str]] = {}
+        self.redirects: Dict[str, str] = {}
+        self.pages: Dict[str, Tuple[int, bytes]] = {}
+        self.statuses: Dict[str, int] = {}
+
+    def load(self, path: str):
+        for record in read_log(path):
+            kind = record.get('k')
+            if kind == MESSAGE:
+                record['text'] = plain_http(record['text'])
+                self.messages.append(record)
+            elif kind == REPLY:
+                self.replies[reply_key(record)] = plain_http(record['reply'])
+            elif kind == HOP:
+                if record['status'] in URLResolver.REDIRECT_STATUSES and record['location']:
+                    self.redirects[record['url']] = plain_http(record['location'])
+                else:
+                    self.statuses[record['url']] = record['status']
+            elif kind == PAGE:
+                content = page_bytes(record).replace(b'https://', b'http://')
+                # A page may be recorded as a head and later in full, keep the longest
+                known = self.pages.get(record['url'])
+                if known is None or len(content) > len(known[1]):
+                    self.pages[record['url']] = (record['status'], content)
+
+    def fill(self, standin: StandInServer):
+        """Load the recorded routes into the stand-in"""
+        for source, target in self.redirects.items():
+            standin.add_redirect(plain_http(source), target)
+        for url, status in self.statuses.items():
+            if url not in self.pages:
+                standin.add_page(plain_http(url), b'', status)
+        for url, (status, content) in self.pages.items():
+            standin.add_page(plain_http(url), content, status)
+
+
+async def replay(bot: ReviewCheckkBot, messages: List[Dict], speedup: float) -> Tuple[Dict, Dict[str, Optional[str]]]:
+    """Run every message at its recorded offset / speedup, returning the summary and replies"""
+    latencies: List[float] = []
+    replies: Dict[str, Optional[str]] = {}
+    failures = 0
+    lag = 0.0
+    first = messages[0]['t'] if messages else 0.0
+    loop = asyncio.get_running_loop()
+
+    async def run_url(record: Dict, index: int, url: str, parsed):
+        nonlocal failures
+        started = time.perf_counter()
+        try:
+            reply = await asyncio.wait_for(bot.process_url(url, parsed), bot.message_deadline)
+        except Exception:
+            failures += 1
+            reply = None
+        latencies.append(time.perf_counter() - started)
+        replies[reply_key({'chat': record['chat'], 'id': record['id'], 'i': index})] = reply
+
+    async def run_message(record: Dict, due: float):
+        nonlocal lag
+        delay = due - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        lag = max(lag, loop.time() - due)
+        parsed = parse_message(record['text'])
+        semaphore = asyncio.Semaphore(bot.message_concurrency)
+
+        async def limited(index: int, url: str):
+            async with semaphore:
+                await run_url(record, index, url, parsed)
+
+        await asyncio.gather(*(limited(index, url) for index, url in enumerate(parsed.urls)))
+
+    started = time.perf_counter()
+    origin = loop.time()
+    await asyncio.gather(*(run_message(record, origin + (record['t'] - first) / speedup)
+                           for record in messages))
+    elapsed = time.perf_counter() - started
+
+    result = {
+        'speedup': speedup,
+        'messages': len(messages),
+        'urls': len(latencies),
+        'failures': failures,
+        'seconds': elapsed,
+        'urls_per_sec': len(latencies) / elapsed if elapsed else 0.0,
+        'max_schedule_lag_ms': lag * 1000,
+    }
+    result.update(latency_summary(latencies))
+    return result, replies
+
+
+def diff_replies(expected: Dict[str, Optional[str]], actual: Dict[str, Optional[str]]) -> List[Dict]:
+    """Links whose reply differs from the expected one"""
+    return [
+        {'key': key, 'expected': expected.get(key), 'actual': actual.get(key)}
+        for key in sorted(set(expected) | set(actual))
+        if plain_http(expected.get(key)) != plain_http(actual.get(key))
+    ]
+
+
+async def run(args) -> Dict:
+    capture = Capture()
+    for path in args.captures:
+        capture.load(path)
+    capture.messages.sort(key=lambda record: record['t'])
+    if not capture.messages:
+        raise SystemExit("No messages in the capture logs")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            expected = json.load(f)
+        compared_to = args.baseline
+    else:
+        expected = capture.replies
+        compared_to = 'capture'
+
+    standin = StandInServer(latency=args.latency / 1000, jitter=args.jitter / 1000,
+                            pages_dir=None, fixtures=None, seed=args.seed)
+    capture.fill(standin)
+    await standin.start()
+    levels = []
+    replies: Dict[str, Optional[str]] = {}
+    try:
+        for speedup in args.speedup:
+            bot = build_bot(standin, args.rate_limit)
+            await bot.startup(bot.application)
+            try:
+                result, replies = await replay(bot, capture.messages, speedup)
+            finally:
+                await bot.shutdown(bot.application)
+            result['mismatches'] = len(diff_replies(expected, replies))
+            levels.append(result)
+            print(f"x{speedup:<6g} {result['urls_per_sec']:8.1f} urls/s  p50={result['p50_ms']:7.1f}ms "
+                  f"p95={result['p95_ms']:7.1f}ms  p99={result['p99_ms']:7.1f}ms  "
+                  f"failures={result['failures']}  mismatches={result['mismatches']}")
+    finally:
+        await standin.stop()
+
+    # Replies from the last (fastest) level are the ones diffed in detail and saved
+    mismatches = diff_replies(expected, replies)
+    for mismatch in mismatches[:args.show]:
+        print(f"\n{mismatch['key']}\n  expected: {mismatch['expected']!r}\n  actual:   {mismatch['actual']!r}")
+    if args.save_replies:
+        with open(args.save_replies, 'w') as f:
+            json.dump(replies, f, indent=2, ensure_ascii=False)
+
+    return {
+        'benchmark': 'replay',
+        'revision': git_revision(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'config': {
+            'captures': args.captures,
+            'compared_to': compared_to,
+            'latency_ms': args.latency,
+            'jitter_ms': args.jitter,
+            'rate_limit': args.rate_limit,
+        },
+        'levels': levels,
+        'mismatches': mismatches,
+        'standin': standin.stats(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('captures', nargs='+', help='capture logs written with CAPTURE_PATH')
+    parser.add_argument('--speedup', default='1',
+                        type=lambda value: [float(v) for v in value.split(',')],
+                        help='comma-separated factors to compress the recorded arrival times by')
+    parser.add_argument('--latency', type=float, default=50.0, help='stand-in response latency in ms')
+    parser.add_argument('--jitter', type=float, default=20.0, help='+/- latency jitter in ms')
+    parser.add_argument('--rate-limit', action='store_true', help='keep the production per-domain rate limits')
+    parser.add_argument('--baseline', help='replies JSON from an earlier --save-replies to diff against')
+    parser.add_argument('--save-replies', help='write the replies of the last level here')
+    parser.add_argument('--show', type=int, default=10, help='mismatching replies to print')
+    parser.add_argument('--seed', type=int, default=1, help='seed for latency jitter')
+    parser.add_argument('--output', help='write results JSON here')
+    parser.add_argument('--verbose', action='store_true', help='keep the bot warnings')
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.ERROR)
+
+    results = asyncio.run(run(args))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,147 @@
+"""Local HTTP stand-in for URL shorteners and retailer sites.
+
+Every hostname is resolved to the local server (StandInResolver), which then
+routes on the Host header. Shortener URLs replay recorded redirect chains and
+product URLs serve saved pages, with configurable latency and error rate.
+"""
+import os
+import json
+import socket
+import random
+import asyncio
+import logging
+from urllib.parse import urlparse
+from typing import Dict, List, Optional, Tuple
+
+from aiohttp import web
+from aiohttp.abc import AbstractResolver
+
+logger = logging.getLogger(__name__)
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PAGES_DIR = os.path.join(BENCH_DIR, 'pages')
+FIXTURES = os.path.join(BENCH_DIR, 'standin.json')
+
+
+def route_key(url: str) -> Tuple[str, str]:
+    """(host, path) used to match a request, ignoring scheme, port and query"""
+    parsed = urlparse(url)
+    return parsed.netloc.lower().split(':')[0], parsed.path or '/'
+
+
+class StandInResolver(AbstractResolver):
+    """Resolve every hostname to the stand-in server"""
+
+    def __init__(self, port: int, host: str = '127.0.0.1'):
+        self.port = port
+        self.host = host
+
+    async def resolve(self, host: str, port: int = 0, family: int = 0) -> List[Dict]:
+        return [{'hostname': host, 'host': self.host, 'port': self.port,
+                 'family': 2, 'proto': 0, 'flags': 0}]
+
+    async def close(self) -> None:
+        pass
+
+
+class StandInServer:
+    """Replays redirect chains and saved pages with injected latency and errors"""
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 pages_dir: Optional[str] = PAGES_DIR, fixtures: Optional[str] = FIXTURES,
+                 seed: Optional[int] = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.redirects: Dict[Tuple[str, str], str] = {}
+        self.pages: Dict[Tuple[str, str], bytes] = {}
+        self.statuses: Dict[Tuple[str, str], int] = {}
+        self.requests = 0
+        self.errors = 0
+        self.bytes_sent = 0
+        self.runner: Optional[web.AppRunner] = None
+        self.port = 0
+        if pages_dir is not None and fixtures is not None:
+            self.load(pages_dir, fixtures)
+
+    def load(self, pages_dir: str, fixtures: str):
+        """Read saved pages from pages_dir/index.json plus redirects and aliases from fixtures"""
+        with open(os.path.join(pages_dir, 'index.json')) as f:
+            index = json.load(f)
+        with open(fixtures) as f:
+            data = json.load(f)
+        for name, url in list(index.items()) + [(name, url) for url, name in data.get('aliases', {}).items()]:
+            with open(os.path.join(pages_dir, name), 'rb') as f:
+                self.pages[route_key(url)] = f.read()
+        for source, target in data.get('redirects', {}).items():
+            self.redirects[route_key(source)] = target
+
+    def add_page(self, url: str, content: bytes, status: int = 200):
+        """Serve content for url with the given status"""
+        key = route_key(url)
+        self.pages[key] = content
+        if status != 200:
+            self.statuses[key] = status
+        else:
+            self.statuses.pop(key, None)
+
+    def add_redirect(self, source: str, target: str):
+        """Redirect source to target"""
+        self.redirects[route_key(source)] = target
+
+    async def handle(self, request: web.Request) -> web.StreamResponse:
+        self.requests += 1
+        delay = self.latency + (self.random.uniform(-self.jitter, self.jitter) if self.jitter else 0)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if self.error_rate and self.random.random() < self.error_rate:
+            self.errors += 1
+            return web.Response(status=503, text='<html><head><title>503 Service Unavailable</title></head></html>',
+                                content_type='text/html')
+
+        key = (request.host.lower().split(':')[0], request.path)
+        target = self.redirects.get(key)
+        if target is not None:
+            raise web.HTTPMovedPermanently(target)
+        page = self.pages.get(key)
+        if page is None:
+            return web.Response(status=404, text='<html><head><title>404 Not Found</title></head></html>',
+                                content_type='text/html')
+
+        # Stream in chunks so head-only readers can hang up early like on a real site
+        response = web.StreamResponse(status=self.statuses.get(key, 200),
+                                      headers={'Content-Type': 'text/html; charset=utf-8'})
+        response.content_length = len(page)
+        await response.prepare(request)
+        try:
+            for start in range(0, len(page), 16 * 1024):
+                await response.write(page[start:start + 16 * 1024])
+                self.bytes_sent += min(16 * 1024, len(page) - start)
+        except ConnectionResetError:
+            # The client hung up once it had what it needed
+            pass
+        return response
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> int:
+        """Start listening, returning the bound port"""
+        app = web.Application()
+        app.router.add_route('*', '/{tail:.*}', self.handle)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((host, port))
+        self.port = sock.getsockname()[1]
+        await web.SockSite(self.runner, sock).start()
+        return self.port
+
+    async def stop(self):
+        """Shut the server down"""
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
+
+    def stats(self) -> Dict[str, int]:
+        """Requests served, injected errors and body bytes written"""
+        return {'requests': self.requests, 'errors': self.errors, 'bytes_sent': self.bytes_sent}
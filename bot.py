@@ -1,13 +1,34 @@
+from __future__ import annotations
+
+import os
+import time
 import asyncio
 import re
+import json
+import random
 import logging
-from urllib.parse import urlparse, parse_qs, urlunparse
-from typing import Optional, List, Dict, Tuple
-import requests
-from bs4 import BeautifulSoup
-from telegram import Update, Message
-from telegram.ext import Application, MessageHandler, filters, ContextTypes
-from telegram.constants import ParseMode
+from urllib.parse import urlparse, urljoin
+from typing import TYPE_CHECKING, Optional, List, Dict, Tuple, NamedTuple
+from http_client import HTTPClient, discard_unread
+from cache import TieredCache
+from singleflight import SingleFlight
+from job_queue import WorkQueue, PRIORITY_PRIVATE, PRIORITY_GROUP, PRIORITY_BULK
+from job_broker import broker_from_env
+from metrics import Metrics
+from retailers import analyze_url, URLAnalysis
+from ocr import PhotoOCR
+from url_normalizer import normalize_url, TRACKING_PARAMS
+from circuit_breaker import BlockedPage, DomainBreakers
+from send_queue import SendScheduler
+from message_parser import ParsedMessage, parse_message
+from capture import TrafficRecorder
+
+# Heavy dependencies are imported where they are first used, so backfill, the
+# benchmarks and worker processes do not pay for what they never touch
+if TYPE_CHECKING:
+    import aiohttp
+    from telegram import Update, Message
+    from telegram.ext import Application, ContextTypes
 
 # Configure logging
 logging.basicConfig(
@@ -16,6 +37,16 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+class Resolution(NamedTuple):
+    """Where a short link lands, plus any HTML the resolver already read on the way"""
+    url: str
+    # Head of the HTML page the chain ended on (a non-retailer landing page), None after a redirect
+    page: Optional[bytes] = None
+    page_url: Optional[str] = None
+    # False when the chain stopped on an error, a non-HTML answer or the hop limit, short of a landing page
+    complete: bool = True
+
+
 class URLResolver:
     """Handle URL unshortening and cleaning"""
 
@@ -25,18 +56,28 @@ class URLResolver:
         'short.me', 'u.to', 'ow.ly', 'tiny.cc', 'is.gd'
     ]
 
-    TRACKING_PARAMS = [
-        'tag', 'ref', 'refRID', 'pf_rd_r', 'pf_rd_p', 'pf_rd_m', 
-        'pf_rd_t', 'pf_rd_s', 'pf_rd_i', 'utm_source', 'utm_medium', 
-        'utm_campaign', 'utm_term', 'utm_content', 'gclid', 'fbclid',
-        'mc_cid', 'mc_eid', '_gl', 'igshid', 'si'
-    ]
+    USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+
+    # Seconds until a domain has enough samples for an adaptive timeout
+    UNSHORTEN_TIMEOUT = 2.5
+
+    MAX_HOPS = 10
+    REDIRECT_STATUSES = {301, 302, 303, 307, 308}
+    META_TAG = re.compile(rb'<meta\b[^>]*>', re.IGNORECASE)
+    META_REFRESH = re.compile(rb'http-equiv\s*=\s*["\']?refresh', re.IGNORECASE)
+    REFRESH_URL = re.compile(rb'content\s*=\s*["\']?\s*\d*\s*[;,]\s*url\s*=\s*["\']?([^"\'\s>]+)', re.IGNORECASE)
+    JS_REDIRECT = re.compile(
+        rb'(?:window\.|document\.|top\.|self\.)?location(?:\.href)?\s*=\s*["\']([^"\']+)["\']'
+        rb'|location\.(?:replace|assign)\(\s*["\']([^"\']+)["\']',
+        re.IGNORECASE,
+    )
+
+    TRACKING_PARAMS = TRACKING_PARAMS
 
     @staticmethod
     def detect_links(text: str) -> List[str]:
         """Extract all URLs from text"""
-        url_pattern = r'https?://(?:[-\w.])+(?::[0-9]+)?(?:/(?:[\w/_.])*)?(?:\?(?:[\w&=%.])*)?(?:#(?:[\w.])*)?'
-        return re.findall(url_pattern, text)
+        return list(parse_message(text).urls)
 
     @staticmethod
     def is_shortener(url: str) -> bool:
@@ -45,46 +86,103 @@ class URLResolver:
         return any(shortener in domain for shortener in URLResolver.SHORTENERS)
 
     @staticmethod
-    async def unshorten_url(url: str) -> str:
+    async def unshorten_url(url: str, client: HTTPClient, cache: Optional[TieredCache] = None) -> str:
         """Resolve shortened URL to final destination"""
-        try:
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-            }
+        return (await URLResolver.resolve(url, client, cache)).url
 
-            def make_request():
-                response = requests.get(url, headers=headers, allow_redirects=True, timeout=2.5)
-                return response.url
+    @staticmethod
+    async def resolve(url: str, client: HTTPClient, cache: Optional[TieredCache] = None) -> Resolution:
+        """Resolve a shortened URL, keeping any redirect page HTML read along the way"""
+        if cache is not None:
+            cached = await cache.aget(url)
+            if cached:
+                return Resolution(cached)
 
-            final_url = await asyncio.to_thread(make_request)
-            return URLResolver.clean_url(final_url)
+        try:
+            resolution = await client.hedged(
+                'unshorten', url, lambda user_agent: URLResolver.follow_redirects(url, client, user_agent),
+                URLResolver.UNSHORTEN_TIMEOUT, TitleCleaner.USER_AGENTS, URLResolver.USER_AGENT,
+            )
 
         except Exception as e:
             logger.warning(f"Failed to unshorten URL {url}: {e}")
-            return URLResolver.clean_url(url)
+            return Resolution(URLResolver.clean_url(url))
+
+        final_url = URLResolver.clean_url(resolution.url)
+        # Only successful resolutions are cached, failures get retried next time
+        if not resolution.complete:
+            logger.warning(f"Unshortening {url} stopped at {resolution.url}, not caching it")
+        elif cache is not None:
+            await cache.aset(url, final_url)
+        return resolution._replace(url=final_url)
+
+    @staticmethod
+    async def follow_redirects(url: str, client: HTTPClient, user_agent: str) -> Resolution:
+        """Follow a short link hop by hop, stopping at the first recognised retailer product URL
+
+        Redirect bodies are never read. A 200 HTML page is read up to the end of its head to
+        look for a meta refresh or JS redirect. The head of the page the chain ends on is returned
+        for title extraction, a redirect page's head never is. A chain that ends on an error
+        status (a rate-limited shortener, say), a non-HTML answer or the hop limit comes back
+        with complete=False.
+        """
+        current = url
+        page = page_url = None
+        complete = False
+        for _ in range(URLResolver.MAX_HOPS):
+            # The retailer page itself is left for the scraper, if it is needed at all
+            if analyze_url(current) is not None:
+                complete = True
+                break
+
+            async with client.session.get(current, headers={'User-Agent': user_agent},
+                                          allow_redirects=False) as response:
+                location = response.headers.get('Location')
+                if client.recorder is not None:
+                    client.recorder.hop(current, response.status, location)
+                if response.status in URLResolver.REDIRECT_STATUSES and location:
+                    discard_unread(response)
+                    current = urljoin(current, location)
+                    continue
+                if response.status != 200 or 'html' not in response.content_type:
+                    discard_unread(response)
+                    break
+                content = await TitleCleaner.read_body(response, TitleCleaner.HEAD_BYTE_CAP, TitleCleaner.HEAD_END)
+                discard_unread(response)
+                if client.recorder is not None:
+                    client.recorder.page(current, response.status, content)
+
+            target = URLResolver.html_redirect(content)
+            if target is None:
+                # Only the page the chain ends on describes the product, never an interstitial
+                page, page_url = content, current
+                complete = True
+                break
+            current = urljoin(current, target)
+        else:
+            # The last hop may still have landed on a retailer URL
+            complete = analyze_url(current) is not None
+
+        return Resolution(current, page, page_url, complete)
+
+    @staticmethod
+    def html_redirect(content: bytes) -> Optional[str]:
+        """Target of a meta refresh or JS location redirect in an HTML page"""
+        for tag in URLResolver.META_TAG.finditer(content):
+            if URLResolver.META_REFRESH.search(tag.group()):
+                match = URLResolver.REFRESH_URL.search(tag.group())
+                if match:
+                    return match.group(1).decode('utf-8', 'replace')
+        match = URLResolver.JS_REDIRECT.search(content)
+        if match:
+            return (match.group(1) or match.group(2)).decode('utf-8', 'replace')
+        return None
 
     @staticmethod
     def clean_url(url: str) -> str:
         """Remove tracking parameters from URL"""
         try:
-            parsed = urlparse(url)
-            query_params = parse_qs(parsed.query)
-
-            # Remove tracking parameters
-            cleaned_params = {
-                k: v for k, v in query_params.items() 
-                if k not in URLResolver.TRACKING_PARAMS
-            }
-
-            # Rebuild query string
-            if cleaned_params:
-                query_string = '&'.join(f"{k}={v[0]}" for k, v in cleaned_params.items())
-                cleaned = parsed._replace(query=query_string)
-            else:
-                cleaned = parsed._replace(query='')
-
-            return urlunparse(cleaned)
-
+            return normalize_url(url)
         except Exception:
             return url
 
@@ -123,116 +221,289 @@ class TitleCleaner:
 
     NOISE_WORDS = {'http', 'https', 'www', 'com', 'in', 'co', 'share', 'the', 'and', 'or', 'at', 'to', 'for', 'of', 'extp', 'faym', 'wishlink'}
 
+    KNOWN_BRANDS = frozenset([
+        'nike', 'adidas', 'puma', 'reebok', 'boat', 'jbl', 'sony',
+        'samsung', 'apple', 'mi', 'realme', 'oneplus', 'vivo', 'oppo',
+        'libas', 'aurelia', 'w', 'biba', 'global desi', 'chemistry',
+        'aqualogica'
+    ])
+
+    SKIP_WORDS = frozenset(['for', 'with', 'and', 'or', 'the', 'a', 'an', 'in', 'on', 'at'])
+
+    # Precompiled lookup tables, built once instead of on every title
+    CLOTHING_WORDS = frozenset(CLOTHING_KEYWORDS)
+    GENDER_WORDS = {gender: frozenset(keywords) for gender, keywords in GENDER_KEYWORDS.items()}
+    ALL_GENDER_WORDS = frozenset(kw for kw_list in GENDER_KEYWORDS.values() for kw in kw_list)
+    CLOTHING_PATTERN = re.compile('|'.join(map(re.escape, CLOTHING_KEYWORDS)))
+
+    SPECIAL_CHARS_PATTERN = re.compile(r'[^\w\s\-&().]')
+    REPEATED_CHAR_PATTERN = re.compile(r'(.)\1{4,}')
+    DIGIT_START_PATTERN = re.compile(r'\d+')
+    DIGIT_PATTERN = re.compile(r'\d')
+    SHORT_CODE_PATTERN = re.compile(r'[a-z0-9]+$')
+    SLUG_SEPARATOR_PATTERN = re.compile(r'[-_]')
+
+    # One alternation tells whether any fluff is present at all. Removal itself stays
+    # one pattern at a time, in list order, since removing one word can expose another
+    FLUFF_PATTERN = re.compile('|'.join(map(re.escape, FLUFF_WORDS)), re.IGNORECASE)
+    FLUFF_PATTERNS = tuple(re.compile(re.escape(fluff), re.IGNORECASE) for fluff in FLUFF_WORDS)
+
+    # Each alternative looks ahead through the whole text, so the first pattern in
+    # QUANTITY_PATTERNS that matches anywhere wins, exactly like searching them in order
+    QUANTITY_PATTERN = re.compile(
+        '|'.join(f'(?=.*?(?P<q{i}>{pattern}))' for i, pattern in enumerate(QUANTITY_PATTERNS)),
+        re.IGNORECASE | re.DOTALL
+    )
+
+    USER_AGENTS = [
+        'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+        'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+        'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+        'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:109.0) Gecko/20100101 Firefox/121.0',
+        'Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.0 Mobile/15E148 Safari/604.1'
+    ]
+
     @staticmethod
-    async def extract_title_from_url(url: str) -> Optional[str]:
+    def build_headers(user_agent: Optional[str] = None) -> Dict[str, str]:
+        """Browser-like request headers with the given or a rotated user agent"""
+        return {
+            'User-Agent': user_agent or random.choice(TitleCleaner.USER_AGENTS),
+            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+            'Accept-Language': 'en-US,en;q=0.9,hi;q=0.8',
+            'Accept-Encoding': 'gzip, deflate',
+            'DNT': '1',
+            'Connection': 'keep-alive',
+            'Upgrade-Insecure-Requests': '1',
+            'Sec-Fetch-Dest': 'document',
+            'Sec-Fetch-Mode': 'navigate',
+            'Sec-Fetch-Site': 'none',
+            'Cache-Control': 'max-age=0'
+        }
+
+    # Streaming caps: enough for the <head> of a product page, and for the whole page
+    HEAD_BYTE_CAP = 128 * 1024
+    BODY_BYTE_CAP = 2 * 1024 * 1024
+    HEAD_END = re.compile(rb'</head\s*>|<body[\s>]', re.IGNORECASE)
+
+    # Seconds until a domain has enough samples for an adaptive timeout
+    SCRAPE_TIMEOUT = 8.0
+
+    # Statuses and page text retailers answer with when they block scrapers
+    BLOCK_STATUSES = {403, 429, 503}
+    BLOCK_TITLE = re.compile(r'captcha|robot check|are you a human|unusual traffic', re.IGNORECASE)
+    BLOCK_BODY = re.compile(rb'validateCaptcha|g-recaptcha|cf-challenge', re.IGNORECASE)
+
+    @staticmethod
+    async def extract_title_from_url(url: str, client: HTTPClient,
+                                     breakers: Optional[DomainBreakers] = None) -> Optional[str]:
         """Extract title from product page with improved headers"""
         try:
-            # Rotate user agents and add more headers to avoid blocking
-            user_agents = [
-                'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-                'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-                'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-                'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:109.0) Gecko/20100101 Firefox/121.0',
-                'Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.0 Mobile/15E148 Safari/604.1'
-            ]
-
-            import random
-            headers = {
-                'User-Agent': random.choice(user_agents),
-                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-                'Accept-Language': 'en-US,en;q=0.9,hi;q=0.8',
-                'Accept-Encoding': 'gzip, deflate, br',
-                'DNT': '1',
-                'Connection': 'keep-alive',
-                'Upgrade-Insecure-Requests': '1',
-                'Sec-Fetch-Dest': 'document',
-                'Sec-Fetch-Mode': 'navigate',
-                'Sec-Fetch-Site': 'none',
-                'Cache-Control': 'max-age=0'
-            }
-
-            def scrape_title():
-                session = requests.Session()
-                session.headers.update(headers)
-
-                # Add delay to avoid rate limiting
-                import time
-                time.sleep(0.5)
-
-                response = session.get(url, timeout=8, allow_redirects=True, verify=False)
-                
-                content = response.content
-                soup = BeautifulSoup(content, 'html.parser')
-
-                # Try multiple title extraction methods
-                title_candidates = []
-
-                # Method 1: og:title
-                og_title = soup.find('meta', property='og:title')
-                if og_title and og_title.get('content'):
-                    title_candidates.append(og_title['content'].strip())
-
-                # Method 2: twitter:title
-                twitter_title = soup.find('meta', attrs={'name': 'twitter:title'})
-                if twitter_title and twitter_title.get('content'):
-                    title_candidates.append(twitter_title['content'].strip())
-
-                # Method 3: page title
-                title_tag = soup.find('title')
-                if title_tag and title_tag.text:
-                    title_candidates.append(title_tag.text.strip())
-
-                # Method 4: h1 tag
-                h1_tag = soup.find('h1')
-                if h1_tag and h1_tag.text:
-                    title_candidates.append(h1_tag.text.strip())
-
-                # Method 5: Product-specific selectors
-                domain = urlparse(url).netloc.lower()
-
-                if 'meesho.com' in domain:
-                    product_title = soup.find('span', class_='Text__StyledText-sc-oo0kvp-0')
-                    if product_title and product_title.text:
-                        title_candidates.append(product_title.text.strip())
-
-                elif 'flipkart.com' in domain or 'fkrt' in domain:
-                    product_title = soup.find('span', class_='B_NuCI')
-                    if not product_title:
-                        product_title = soup.find('h1', class_='x2cTzZ')
-                    if not product_title:
-                        product_title = soup.find('span', class_='VU-ZEz')
-                    if product_title and product_title.text:
-                        title_candidates.append(product_title.text.strip())
-
-                elif 'amazon.in' in domain:
-                    product_title = soup.find('span', id='productTitle')
-                    if product_title and product_title.text:
-                        title_candidates.append(product_title.text.strip())
-
-                elif 'wishlink.com' in domain or 'extp.in' in domain or 'faym.co' in domain:
-                    selectors = ['h1', '.product-title', '.title', '#title', '.product-name']
-                    for sel in selectors:
-                        elem = soup.select_one(sel)
-                        if elem and elem.text:
-                            title_candidates.append(elem.text.strip())
-
-                # Check for error pages
-                if any('denied' in t.lower() or 'error' in t.lower() or '403' in t.lower() for t in title_candidates):
-                    return None
-
-                # Return the best candidate (shortest non-empty title usually best)
-                valid_titles = [t for t in title_candidates if t and len(t) > 5]
-                if valid_titles:
-                    return min(valid_titles, key=len)  # Return shortest valid title
-
-                return title_candidates[0] if title_candidates else None
-
-            return await asyncio.to_thread(scrape_title)
+            # Slow pages get a second attempt with another user agent once they pass the domain's p90
+            title = await client.hedged(
+                'scrape', url, lambda user_agent: TitleCleaner.fetch_title(url, client, user_agent),
+                TitleCleaner.SCRAPE_TIMEOUT, TitleCleaner.USER_AGENTS,
+            )
 
         except Exception as e:
             logger.warning(f"Failed to extract title from {url}: {e}")
+            if breakers is not None:
+                breakers.record_failure(url, blocked=isinstance(e, BlockedPage))
             return None
 
+        if breakers is not None:
+            breakers.record_success(url)
+        return title
+
+    @staticmethod
+    async def fetch_title(url: str, client: HTTPClient, user_agent: str) -> Optional[str]:
+        """One attempt at streaming a product page and picking its title"""
+        async with client.session.get(url, headers=TitleCleaner.build_headers(user_agent),
+                                      allow_redirects=True, ssl=False) as response:
+            try:
+                if response.status in TitleCleaner.BLOCK_STATUSES:
+                    if client.recorder is not None:
+                        client.recorder.page(url, response.status, b'')
+                    raise BlockedPage(f"HTTP {response.status} from {url}")
+
+                # Read only until the head metadata has arrived
+                content = await TitleCleaner.read_body(response, TitleCleaner.HEAD_BYTE_CAP, TitleCleaner.HEAD_END)
+
+                # Parsing is CPU-bound, keep it off the event loop
+                candidates = await asyncio.to_thread(TitleCleaner.title_candidates, content, url, False)
+                if TitleCleaner.has_usable_title(candidates):
+                    if client.recorder is not None:
+                        client.recorder.page(url, response.status, content)
+                    TitleCleaner.check_blocked(candidates, content, url)
+                    return TitleCleaner.pick_title(candidates)
+
+                # Head was not enough, read on for the site-specific selectors
+                content += await TitleCleaner.read_body(response, TitleCleaner.BODY_BYTE_CAP - len(content))
+                content = content[:TitleCleaner.BODY_BYTE_CAP]
+                if client.recorder is not None:
+                    client.recorder.page(url, response.status, content)
+            finally:
+                discard_unread(response)
+
+        candidates = await asyncio.to_thread(TitleCleaner.title_candidates, content, url, True)
+        TitleCleaner.check_blocked(candidates, content, url)
+        return TitleCleaner.pick_title(candidates)
+
+    @staticmethod
+    def check_blocked(title_candidates: List[str], content: bytes, url: str):
+        """Raise BlockedPage when a fetched page is a CAPTCHA or bot check page
+
+        is_error_page is too loose to count against a domain ("Terror Tees", a model
+        number with 403 in it); pick_title just drops those titles as before.
+        """
+        if (any(TitleCleaner.BLOCK_TITLE.search(t) for t in title_candidates)
+                or TitleCleaner.BLOCK_BODY.search(content)):
+            raise BlockedPage(f"Block page from {url}")
+
+    @staticmethod
+    async def read_body(response: aiohttp.ClientResponse, limit: int, stop: Optional[re.Pattern] = None) -> bytes:
+        """Read the response body in chunks until limit bytes or the stop pattern is seen
+
+        The last chunk is kept whole, so the result can run up to one chunk past limit;
+        a later read_body then carries on exactly where this one stopped.
+        """
+        if limit <= 0:
+            return b''
+        buffer = bytearray()
+        async for chunk in response.content.iter_chunked(16 * 1024):
+            # Search a little before the new chunk in case the marker spans two chunks
+            start = max(len(buffer) - 16, 0)
+            buffer += chunk
+            if len(buffer) >= limit:
+                break
+            if stop is not None and stop.search(buffer, start):
+                break
+        return bytes(buffer)
+
+    @staticmethod
+    def parse_title(content: bytes, url: str) -> Optional[str]:
+        """Pick the best title candidate from a full product page"""
+        return TitleCleaner.pick_title(TitleCleaner.title_candidates(content, url))
+
+    @staticmethod
+    def title_candidates(content: bytes, url: str, deep: bool = True) -> List[str]:
+        """Collect title candidates, head metadata first and page selectors when deep"""
+        # Single-pass lxml extraction, BeautifulSoup only when it fails or finds nothing
+        try:
+            from html_title import extract_title_candidates
+            candidates = extract_title_candidates(content, urlparse(url).netloc.lower(), deep)
+            if candidates:
+                return candidates
+        except Exception as e:
+            logger.debug(f"Fast title extraction failed for {url}: {e}")
+        return TitleCleaner.soup_title_candidates(content, url, deep)
+
+    @staticmethod
+    def soup_title_candidates(content: bytes, url: str, deep: bool = True) -> List[str]:
+        """Collect title candidates with a full BeautifulSoup parse"""
+        from bs4 import BeautifulSoup
+        soup = BeautifulSoup(content, 'html.parser')
+
+        # Try multiple title extraction methods
+        title_candidates = []
+
+        # Method 1: og:title
+        og_title = soup.find('meta', property='og:title')
+        if og_title and og_title.get('content'):
+            title_candidates.append(og_title['content'].strip())
+
+        # Method 2: twitter:title
+        twitter_title = soup.find('meta', attrs={'name': 'twitter:title'})
+        if twitter_title and twitter_title.get('content'):
+            title_candidates.append(twitter_title['content'].strip())
+
+        # Method 3: page title
+        title_tag = soup.find('title')
+        if title_tag and title_tag.text:
+            title_candidates.append(title_tag.text.strip())
+
+        if not deep:
+            return title_candidates
+
+        # Method 4: h1 tag
+        h1_tag = soup.find('h1')
+        if h1_tag and h1_tag.text:
+            title_candidates.append(h1_tag.text.strip())
+
+        # Method 5: Product-specific selectors
+        domain = urlparse(url).netloc.lower()
+
+        if 'meesho.com' in domain:
+            product_title = soup.find('span', class_='Text__StyledText-sc-oo0kvp-0')
+            if product_title and product_title.text:
+                title_candidates.append(product_title.text.strip())
+
+        elif 'flipkart.com' in domain or 'fkrt' in domain:
+            product_title = soup.find('span', class_='B_NuCI')
+            if not product_title:
+                product_title = soup.find('h1', class_='x2cTzZ')
+            if not product_title:
+                product_title = soup.find('span', class_='VU-ZEz')
+            if product_title and product_title.text:
+                title_candidates.append(product_title.text.strip())
+
+        elif 'amazon.in' in domain:
+            product_title = soup.find('span', id='productTitle')
+            if product_title and product_title.text:
+                title_candidates.append(product_title.text.strip())
+
+        elif 'wishlink.com' in domain or 'extp.in' in domain or 'faym.co' in domain:
+            selectors = ['h1', '.product-title', '.title', '#title', '.product-name']
+            for sel in selectors:
+                elem = soup.select_one(sel)
+                if elem and elem.text:
+                    title_candidates.append(elem.text.strip())
+
+        return title_candidates
+
+    # Titles of interstitial pages that say nothing about the product
+    REDIRECT_TITLE = re.compile(r'redirect|loading|please wait|moved', re.IGNORECASE)
+
+    @staticmethod
+    def page_title(content: bytes, url: str) -> Optional[str]:
+        """Title from an already fetched page head, None unless it clearly names a product"""
+        candidates = [t for t in TitleCleaner.title_candidates(content, url, False)
+                      if not TitleCleaner.REDIRECT_TITLE.search(t)]
+        if not TitleCleaner.has_usable_title(candidates):
+            return None
+        return TitleCleaner.pick_title(candidates)
+
+    @staticmethod
+    def is_error_page(title_candidates: List[str]) -> bool:
+        """Check whether the candidates come from a block or error page"""
+        return any('denied' in t.lower() or 'error' in t.lower() or '403' in t.lower() for t in title_candidates)
+
+    @staticmethod
+    def has_usable_title(title_candidates: List[str]) -> bool:
+        """Check whether the candidates already settle the result without a deeper parse"""
+        return TitleCleaner.is_error_page(title_candidates) or any(len(t) > 5 for t in title_candidates)
+
+    @staticmethod
+    def pick_title(title_candidates: List[str]) -> Optional[str]:
+        """Choose the best title from the collected candidates"""
+        # Check for error pages
+        if TitleCleaner.is_error_page(title_candidates):
+            return None
+
+        # Return the best candidate (shortest non-empty title usually best)
+        valid_titles = [t for t in title_candidates if t and len(t) > 5]
+        if valid_titles:
+            return min(valid_titles, key=len)  # Return shortest valid title
+
+        return title_candidates[0] if title_candidates else None
+
+    @staticmethod
+    def product_key(url: str) -> str:
+        """Canonical product identity used to key the title cache"""
+        analysis = analyze_url(url)
+        if analysis is not None:
+            return analysis.product_key
+        return f"url:{URLResolver.clean_url(url)}"
+
     @staticmethod
     def extract_title_from_url_slug(url: str) -> Optional[str]:
         """Intelligently extracts product names from URL paths"""
@@ -242,10 +513,10 @@ class TitleCleaner:
         if not segments:
             return None
         slug = segments[-1]
-        if len(slug) < 8 and re.match(r'[a-z0-9]+$', slug):
+        if len(slug) < 8 and TitleCleaner.SHORT_CODE_PATTERN.match(slug):
             return None  # Skip short codes like nm7xhr
-        title = re.sub(r'[-_]', ' ', slug)
-        title = re.sub(r'\d+', '', title)
+        title = TitleCleaner.SLUG_SEPARATOR_PATTERN.sub(' ', slug)
+        title = TitleCleaner.DIGIT_START_PATTERN.sub('', title)
         title = ' '.join(word.capitalize() for word in title.split() if len(word) > 1)
         if len(title) < 5:
             return None
@@ -258,16 +529,14 @@ class TitleCleaner:
             return ""
 
         # Remove emojis and special characters except basic punctuation
-        title = re.sub(r'[^\w\s\-&().]', ' ', raw_title)
+        title = TitleCleaner.SPECIAL_CHARS_PATTERN.sub(' ', raw_title)
 
         # Remove fluff words
-        for fluff in TitleCleaner.FLUFF_WORDS:
-            title = re.sub(re.escape(fluff), '', title, flags=re.IGNORECASE)
-
-        # Normalize whitespace
-        title = ' '.join(title.split())
+        if TitleCleaner.FLUFF_PATTERN.search(title):
+            for pattern in TitleCleaner.FLUFF_PATTERNS:
+                title = pattern.sub('', title)
 
-        # Noise word filtering
+        # Normalize whitespace and filter noise words
         title = ' '.join(word for word in title.split() if word.lower() not in TitleCleaner.NOISE_WORDS)
 
         # Reject nonsense titles
@@ -281,13 +550,14 @@ class TitleCleaner:
     def format_with_new_rules(title: str) -> str:
         """Format title according to: [Brand] [Gender] [Quantity] [Product Name]"""
         words = title.lower().split()
+        text = ' '.join(words)
 
         # Extract components
         brand = TitleCleaner.extract_brand(words)
         gender = TitleCleaner.extract_gender(words)
-        quantity = TitleCleaner.extract_quantity(' '.join(words))
+        quantity = TitleCleaner.extract_quantity(text)
         product = TitleCleaner.extract_product(words)
-        is_clothing = TitleCleaner.is_clothing_item(' '.join(words))
+        is_clothing = TitleCleaner.is_clothing_item(text)
 
         # Build final title
         parts = []
@@ -317,63 +587,59 @@ class TitleCleaner:
     @staticmethod
     def extract_gender(words: List[str]) -> Optional[str]:
         """Extract gender from words"""
-        for gender, keywords in TitleCleaner.GENDER_KEYWORDS.items():
-            if any(keyword in words for keyword in keywords):
+        word_set = set(words)
+        for gender, keywords in TitleCleaner.GENDER_WORDS.items():
+            if not keywords.isdisjoint(word_set):
                 return gender.title()
         return None
 
     @staticmethod
     def extract_quantity(text: str) -> Optional[str]:
         """Extract quantity information"""
-        for pattern in TitleCleaner.QUANTITY_PATTERNS:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                quantity = match.group(1) if match.groups() else match.group(0)
-                # Format based on pattern type
-                if 'pack of' in pattern.lower():
-                    return f"Pack of {quantity}"
-                elif 'set of' in pattern.lower():
-                    return f"Set of {quantity}"
-                elif 'pcs' in pattern or 'pieces' in pattern:
-                    return f"{quantity} Pcs"
-                elif 'kg' in pattern:
-                    return f"{quantity}kg"
-                elif 'g ' in pattern:
-                    return f"{quantity}g"
-                elif 'ml' in pattern:
-                    return f"{quantity}ml"
-                elif 'l ' in pattern:
-                    return f"{quantity}L"
-                elif 'combo' in pattern:
-                    return f"Combo of {quantity}"
-                elif 'pairs' in pattern:
-                    return f"{quantity} Pairs"
-                elif 'multipack' in pattern:
-                    return f"Multipack {quantity}"
-                else:
-                    return f"{quantity} Pcs"
+        # Every quantity pattern needs a number, skip the scan when there is none
+        match = TitleCleaner.DIGIT_PATTERN.search(text) and TitleCleaner.QUANTITY_PATTERN.match(text)
+        if match:
+            # The named group tells which pattern matched, its (\d+) group follows it
+            index = match.re.groupindex[match.lastgroup]
+            pattern = TitleCleaner.QUANTITY_PATTERNS[int(match.lastgroup[1:])]
+            quantity = match.group(index + 1)
+            # Format based on pattern type
+            if 'pack of' in pattern.lower():
+                return f"Pack of {quantity}"
+            elif 'set of' in pattern.lower():
+                return f"Set of {quantity}"
+            elif 'pcs' in pattern or 'pieces' in pattern:
+                return f"{quantity} Pcs"
+            elif 'kg' in pattern:
+                return f"{quantity}kg"
+            elif 'g ' in pattern:
+                return f"{quantity}g"
+            elif 'ml' in pattern:
+                return f"{quantity}ml"
+            elif 'l ' in pattern:
+                return f"{quantity}L"
+            elif 'combo' in pattern:
+                return f"Combo of {quantity}"
+            elif 'pairs' in pattern:
+                return f"{quantity} Pairs"
+            elif 'multipack' in pattern:
+                return f"Multipack {quantity}"
+            else:
+                return f"{quantity} Pcs"
         return None
 
     @staticmethod
     def extract_brand(words: List[str]) -> Optional[str]:
         """Extract brand name (usually first meaningful word)"""
-        # Common brands to prioritize
-        known_brands = [
-            'nike', 'adidas', 'puma', 'reebok', 'boat', 'jbl', 'sony', 
-            'samsung', 'apple', 'mi', 'realme', 'oneplus', 'vivo', 'oppo',
-            'libas', 'aurelia', 'w', 'biba', 'global desi', 'chemistry',
-            'aqualogica'
-        ]
-
         # Look for known brands first
         for word in words:
-            if word in known_brands:
+            if word in TitleCleaner.KNOWN_BRANDS:
                 return word.title()
 
         # If no known brand, take first meaningful word (not gender/quantity)
         for word in words:
-            if (word not in [kw for kw_list in TitleCleaner.GENDER_KEYWORDS.values() for kw in kw_list] 
-                and not re.match(r'\d+', word) 
+            if (word not in TitleCleaner.ALL_GENDER_WORDS
+                and not TitleCleaner.DIGIT_START_PATTERN.match(word)
                 and len(word) > 2):
                 return word.title()
 
@@ -384,18 +650,17 @@ class TitleCleaner:
         """Extract product name (clothing items or main product)"""
         # Find clothing keywords
         for word in words:
-            if word in TitleCleaner.CLOTHING_KEYWORDS:
+            if word in TitleCleaner.CLOTHING_WORDS:
                 return word.title()
 
         # If not clothing, extract meaningful product words
         product_words = []
-        skip_words = ['for', 'with', 'and', 'or', 'the', 'a', 'an', 'in', 'on', 'at']
 
         for word in words:
-            if (len(word) > 2 
-                and word not in skip_words
-                and word not in [kw for kw_list in TitleCleaner.GENDER_KEYWORDS.values() for kw in kw_list]
-                and not re.match(r'\d+', word)):
+            if (len(word) > 2
+                and word not in TitleCleaner.SKIP_WORDS
+                and word not in TitleCleaner.ALL_GENDER_WORDS
+                and not TitleCleaner.DIGIT_START_PATTERN.match(word)):
                 product_words.append(word)
 
         # Take last 2-3 meaningful words as product name
@@ -408,12 +673,13 @@ class TitleCleaner:
             return True
 
         # Check for lack of vowels
-        vowel_count = len([c for c in title.lower() if c in 'aeiou'])
+        lowered = title.lower()
+        vowel_count = sum(lowered.count(vowel) for vowel in 'aeiou')
         if vowel_count < len(title) * 0.1:  # Less than 10% vowels
             return True
 
         # Check for repeated characters
-        if re.search(r'(.)\1{4,}', title):  # Same char repeated 5+ times
+        if TitleCleaner.REPEATED_CHAR_PATTERN.search(title):  # Same char repeated 5+ times
             return True
 
         return False
@@ -421,31 +687,15 @@ class TitleCleaner:
     @staticmethod
     def is_clothing_item(title: str) -> bool:
         """Check if product is clothing item"""
-        return any(keyword in title.lower() for keyword in TitleCleaner.CLOTHING_KEYWORDS)
+        return TitleCleaner.CLOTHING_PATTERN.search(title.lower()) is not None
 
 class PriceExtractor:
     """Extract and format prices"""
 
     @staticmethod
     def extract_prices(text: str) -> List[int]:
-        """Extract all prices from text"""
-        price_patterns = [
-            r'(?:₹|Rs?\.?\s*)(\d[\d,]*)',  # ₹1299 or Rs. 1299
-            r'(\d[\d,]*)\s*(?:₹|Rs?\.?)',  # 1299₹ or 1299 Rs
-            r'price\s*:?\s*(?:₹|Rs?\.?\s*)(\d[\d,]*)',  # price: ₹1299
-            r'cost\s*:?\s*(?:₹|Rs?\.?\s*)(\d[\d,]*)',   # cost: ₹1299
-            r'@\s*(\d[\d,]*)\s*rs',  # @1299 rs
-        ]
-
-        prices = []
-        for pattern in price_patterns:
-            matches = re.findall(pattern, text, re.IGNORECASE)
-            for match in matches:
-                if match:
-                    price = match.replace(',', '')
-                    if price.isdigit() and int(price) > 0:
-                        prices.append(int(price))
-        return prices
+        """Extract all prices from text, each number counted once"""
+        return parse_message(text).price_values
 
     @staticmethod
     def format_price(price: str, is_from: bool = False) -> str:
@@ -462,15 +712,7 @@ class PinDetector:
     @staticmethod
     def extract_pin(text: str) -> str:
         """Extract 6-digit PIN code from text"""
-        pin_pattern = r'\b(\d{6})\b'
-        matches = re.findall(pin_pattern, text)
-
-        for pin in matches:
-            # Validate PIN (should not be all same digits or sequential)
-            if len(set(pin)) > 1 and not re.match(r'123456|654321', pin):
-                return pin
-
-        return "110001"  # Default PIN for Delhi
+        return parse_message(text).pin
 
 class ResponseBuilder:
     """Build formatted responses"""
@@ -495,12 +737,108 @@ class ResponseBuilder:
 class ReviewCheckkBot:
     """Main bot class"""
 
+    STAGE_SECONDS = 'dealbot_stage_seconds'
+    URL_SECONDS = 'dealbot_url_seconds'
+
+    # Minimum retailer slug confidence to use the slug title instead of scraping
+    FAST_PATH_CONFIDENCE = 0.8
+
     def __init__(self, token: str):
-        self.application = Application.builder().token(token).build()
+        self.http = HTTPClient.from_env()
+        # Entry caps are generous, the byte budgets are what bound these on a 512 MB dyno
+        self.url_cache = TieredCache.from_env('resolved_urls', ttl=7 * 86400, memory_entries=1_000_000, memory_mb=48)
+        self.title_cache = TieredCache.from_env('product_titles', ttl=86400, memory_entries=1_000_000, memory_mb=48)
+        self.resolve_flight = SingleFlight('unshorten')
+        self.scrape_flight = SingleFlight('scrape')
+        self.breakers = DomainBreakers.from_env(self.http.rate_limiter.domain_key)
+        self.recorder = TrafficRecorder.from_env()
+        self.http.recorder = self.recorder
+        self.message_concurrency = int(os.environ.get('MESSAGE_CONCURRENCY', 4))
+        self.message_deadline = float(os.environ.get('MESSAGE_DEADLINE', 20.0))
+        self.queue = WorkQueue(
+            workers=int(os.environ.get('QUEUE_WORKERS', 8)),
+            max_size=int(os.environ.get('QUEUE_SIZE', 100)),
+        )
+        self.ocr = PhotoOCR.from_env()
+        # Set in the intake process of a multi-process deployment, see cluster.py
+        self.broker = broker_from_env()
+        self.metrics = Metrics.from_env()
+        self.sender = SendScheduler.from_env(self.metrics)
+        self.setup_metrics()
+        from telegram.ext import Application
+        self.application = (
+            Application.builder().token(token)
+            .post_init(self.startup)
+            .post_shutdown(self.shutdown)
+            .build()
+        )
         self.setup_handlers()
 
+    async def startup(self, application: Application):
+        """Start background workers once the event loop is running"""
+        self.queue.start()
+        await self.metrics.start()
+
+    async def shutdown(self, application: Application):
+        """Release shared resources when the application stops"""
+        await self.metrics.stop()
+        await self.queue.stop()
+        await self.sender.close()
+        await self.http.close()
+        self.ocr.close()
+        self.url_cache.close()
+        self.title_cache.close()
+        if self.broker is not None:
+            self.broker.close()
+        if self.recorder is not None:
+            self.recorder.close()
+
+    def setup_metrics(self):
+        """Register latency histograms and export component stats as gauges"""
+        self.metrics.histogram(self.STAGE_SECONDS, 'Latency of each process_url stage by domain')
+        self.metrics.histogram(self.URL_SECONDS, 'End-to-end process_url latency by domain and title strategy')
+        self.metrics.histogram(SendScheduler.SEND_SECONDS, 'Telegram reply API call latency')
+        self.metrics.histogram(SendScheduler.QUEUE_SECONDS, 'Time from queueing a reply to Telegram accepting it')
+        self.metrics.add_collector('dealbot_sender', self.sender.stats)
+        self.metrics.add_collector('dealbot_rate_limit', self.http.rate_limiter.stats, label='domain')
+        self.metrics.add_collector('dealbot_url_cache', self.url_cache.stats)
+        self.metrics.add_collector('dealbot_title_cache', self.title_cache.stats)
+        self.metrics.add_collector('dealbot_cache_memory', self.memory_report, label='cache')
+        self.metrics.add_collector('dealbot_unshorten_flight', self.resolve_flight.stats)
+        self.metrics.add_collector('dealbot_scrape_flight', self.scrape_flight.stats)
+        self.metrics.add_collector('dealbot_queue', self.queue.stats)
+        self.metrics.add_collector('dealbot_ocr', self.ocr.stats)
+        self.metrics.add_collector('dealbot_hedge', self.http.hedger.stats)
+        self.metrics.add_collector('dealbot_domain_latency', self.http.hedger.domain_stats, label='domain')
+        self.metrics.add_collector('dealbot_breaker', self.breakers.stats)
+        self.metrics.add_collector('dealbot_breaker_domain', self.breakers.domain_stats, label='domain')
+        if self.broker is not None:
+            self.metrics.add_collector('dealbot_broker', self.broker.stats, blocking=True)
+        if self.recorder is not None:
+            self.metrics.add_collector('dealbot_capture', self.recorder.stats)
+
+    def memory_report(self) -> Dict[str, Dict[str, int]]:
+        """Entry count, estimated bytes and byte budget of each in-process cache"""
+        caches = {
+            'resolved_urls': self.url_cache.memory,
+            'product_titles': self.title_cache.memory,
+            'photo_text': self.ocr.cache.memory,
+            'failed_urls': self.breakers.failed_urls,
+        }
+        return {
+            name: {'entries': len(cache), 'bytes': cache.stats()['bytes'], 'budget_bytes': cache.max_bytes or 0}
+            for name, cache in caches.items()
+        }
+
+    @staticmethod
+    def metric_domain(url: str) -> str:
+        """Host used as the domain label, without www. and port"""
+        host = urlparse(url).netloc.lower().split(':')[0]
+        return host[4:] if host.startswith('www.') else host
+
     def setup_handlers(self):
         """Setup message handlers"""
+        from telegram.ext import MessageHandler, filters
         # Handle all messages with links or images
         self.application.add_handler(
             MessageHandler(
@@ -510,36 +848,156 @@ class ReviewCheckkBot:
         )
 
     async def handle_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Main message handler"""
+        """Main message handler, hands the network work to the job queue"""
+        message = update.effective_message
         try:
-            message = update.message
-
             # Get text from message or caption
             text = self.extract_text(message)
 
             if not text:
-                if message.photo:
-                    await message.reply_text("No title provided")
+                if message.photo and self.ocr.enabled:
+                    if await self.dispatch(message, ""):
+                        return
+                    # Photo-only deals are usually screenshots, read them on the OCR pool
+                    self.queue.submit(
+                        self.message_priority(message),
+                        lambda: self.process_photo(message),
+                        on_shed=lambda: self.sender.send(message, "No title provided"),
+                    )
+                elif message.photo:
+                    # Queued without waiting, a flood-limited chat must not hold up intake
+                    self.sender.submit(message, "No title provided")
                 return
 
-            # Extract and process URLs
-            urls = URLResolver.detect_links(text)
+            # One scan of the text serves every URL in it
+            parsed = parse_message(text)
 
-            if not urls:
+            if not parsed.urls:
                 return  # No URLs to process
 
-            # Process each URL
-            for url in urls:
-                response = await self.process_url(url, text)
-                if response:
-                    if message.photo:
-                        await message.reply_photo(photo=message.photo[-1].file_id, caption=response)
-                    else:
-                        await message.reply_text(response)
+            if self.recorder is not None:
+                self.recorder.message(message.chat_id, message.message_id, text)
+
+            # Worker processes take the job when a broker is configured
+            if await self.dispatch(message, text):
+                return
+
+            # When the queue is full the lowest priority message is answered offline instead
+            self.queue.submit(
+                self.message_priority(message),
+                lambda: self.process_message(message, parsed),
+                on_shed=lambda: self.reply_offline(message, parsed),
+            )
 
         except Exception as e:
             logger.error(f"Error handling message: {e}")
-            await update.message.reply_text("❌ Unable to extract product info")
+            self.sender.submit(message, "❌ Unable to extract product info")
+
+    async def dispatch(self, message: Message, text: str) -> bool:
+        """Hand a message to the worker processes, False to process it in this one instead
+
+        A full or unreachable broker leaves the message to the local queue, which
+        sheds to an offline reply under load.
+        """
+        if self.broker is None:
+            return False
+        try:
+            return await self.broker.push(self.message_priority(message), self.message_job(message, text))
+        except self.broker.ERRORS as e:
+            logger.warning(f"Job broker unavailable, processing message {message.message_id} locally: {e}")
+            return False
+
+    @staticmethod
+    def message_job(message: Message, text: str) -> Dict:
+        """What a worker process needs to answer a message, as a JSON-serialisable job"""
+        photo = message.photo[-1] if message.photo else None
+        return {
+            'chat_id': message.chat_id,
+            'message_id': message.message_id,
+            'text': text,
+            'photo': {'file_id': photo.file_id, 'file_unique_id': photo.file_unique_id} if photo else None,
+        }
+
+    @staticmethod
+    def message_priority(message: Message) -> int:
+        """Private chats first, then group messages, then bulk channel and group forwards"""
+        from telegram.constants import ChatType
+        chat_type = message.chat.type
+        if chat_type == ChatType.PRIVATE:
+            return PRIORITY_PRIVATE
+        if chat_type == ChatType.CHANNEL or message.forward_date:
+            return PRIORITY_BULK
+        return PRIORITY_GROUP
+
+    async def process_message(self, message: Message, parsed: ParsedMessage):
+        """Queue job: process every URL in a message and reply"""
+        try:
+            await self.process_urls(message, parsed)
+        except Exception as e:
+            logger.error(f"Error handling message: {e}")
+            await self.sender.send(message, "❌ Unable to extract product info")
+
+    async def process_photo(self, message: Message):
+        """Queue job: OCR a photo-only message and process the links found in it"""
+        try:
+            with self.metrics.timer(self.STAGE_SECONDS, stage='ocr', domain='photo'):
+                text = await self.ocr.photo_text(message.photo[-1])
+            parsed = parse_message(text)
+            if not parsed.urls:
+                await self.sender.send(message, "No title provided")
+                return
+            await self.process_urls(message, parsed)
+        except Exception as e:
+            logger.error(f"Error handling photo message: {e}")
+            await self.sender.send(message, "❌ Unable to extract product info")
+
+    async def reply_offline(self, message: Message, parsed: ParsedMessage):
+        """Reply using only the message text, cached resolutions and URL slugs"""
+        logger.warning(f"Job queue full, shed message {message.message_id} to an offline reply")
+        clean_title = self.forwarded_clean_title(parsed)
+        sent = []
+        for url in parsed.urls:
+            final_url = await self.url_cache.aget(url) if URLResolver.is_shortener(url) else None
+            final_url = final_url or URLResolver.clean_url(url)
+            sent.append(self.queue_response(message, self.build_reply(final_url, parsed, clean_title)))
+        await asyncio.gather(*sent)
+
+    async def process_urls(self, message: Message, parsed: ParsedMessage):
+        """Process a message's URLs concurrently, replying in their original order"""
+        urls = parsed.urls
+        semaphore = asyncio.Semaphore(self.message_concurrency)
+
+        async def run(url: str) -> Optional[str]:
+            async with semaphore:
+                return await self.process_url(url, parsed)
+
+        tasks = [asyncio.ensure_future(run(url)) for url in urls]
+        sent = []
+        deadline = asyncio.get_running_loop().time() + self.message_deadline
+        try:
+            # Each reply goes out as soon as it and every URL before it are done
+            for index, (url, task) in enumerate(zip(urls, tasks)):
+                remaining = deadline - asyncio.get_running_loop().time()
+                done, _ = await asyncio.wait({task}, timeout=max(remaining, 0))
+                if not done:
+                    pending = sum(1 for t in tasks if not t.done())
+                    logger.warning(f"Message deadline hit at {url}, dropping {pending} pending URLs")
+                    break
+                response = task.result()
+                if self.recorder is not None:
+                    self.recorder.reply(message.chat_id, message.message_id, index, url, response)
+                if response:
+                    # Queued without waiting, so replies ready together can share one message
+                    sent.append(self.queue_response(message, response))
+        finally:
+            for task in tasks:
+                task.cancel()
+        # The job ends once Telegram has every reply, keeping the work queue's backpressure
+        await asyncio.gather(*sent)
+
+    def queue_response(self, message: Message, response: str) -> asyncio.Future:
+        """Queue the formatted response on the send scheduler, keeping the original photo if any"""
+        return self.sender.submit(message, response, photo=bool(message.photo))
 
     def extract_text(self, message: Message) -> str:
         """Extract text from message or caption"""
@@ -551,96 +1009,166 @@ class ReviewCheckkBot:
             return message.forward_from.text
         return ""
 
-    async def process_url(self, url: str, message_text: str) -> Optional[str]:
+    async def process_url(self, url: str, parsed: ParsedMessage) -> Optional[str]:
         """Process a single URL and return formatted response"""
+        started = time.perf_counter()
         try:
             # Unshorten URL if needed
             if URLResolver.is_shortener(url):
-                final_url = await URLResolver.unshorten_url(url)
+                with self.metrics.timer(self.STAGE_SECONDS, stage='unshorten', domain=self.metric_domain(url)):
+                    resolution = await self.resolve_flight.do(
+                        url, lambda: URLResolver.resolve(url, self.http, self.url_cache)
+                    )
             else:
-                final_url = URLResolver.clean_url(url)
+                resolution = Resolution(URLResolver.clean_url(url))
+            final_url = resolution.url
+            analysis = analyze_url(final_url)
+            if analysis is not None:
+                final_url = analysis.canonical_url
+            domain = self.metric_domain(final_url)
 
             # Strategy 1: Forwarded message title patterns
-            forwarded_title = self.extract_forwarded_title(message_text)
-            clean_title = ""
-            if forwarded_title:
-                clean_title = TitleCleaner.clean_title(forwarded_title)
+            strategy = 'forwarded'
+            with self.metrics.timer(self.STAGE_SECONDS, stage='clean', domain=domain):
+                clean_title = self.forwarded_clean_title(parsed)
 
-            # Strategy 2: Web scraping
-            if not clean_title:
-                scraped_title = await TitleCleaner.extract_title_from_url(final_url)
-                if scraped_title:
-                    clean_title = TitleCleaner.clean_title(scraped_title)
+                # Known retailer URLs that name the product clearly need no scrape
+                if not clean_title and analysis is not None and analysis.confidence >= self.FAST_PATH_CONFIDENCE:
+                    strategy = 'url'
+                    clean_title = TitleCleaner.clean_title(analysis.title)
 
-            # Strategy 3: URL slug extraction
+            # Strategy 2: Web scraping (served from the title cache for known products)
             if not clean_title:
-                slug_title = TitleCleaner.extract_title_from_url_slug(final_url)
-                if slug_title:
-                    clean_title = TitleCleaner.clean_title(slug_title)
+                strategy = 'scrape'
+                clean_title = await self.scrape_clean_title(final_url, resolution.page, resolution.page_url)
 
-            # Strategy 4: Message text cleaning as final fallback
+            # Strategies 3 and 4: URL slug, then the message text
             if not clean_title:
-                message_title = self.clean_message_as_title(message_text)
-                if message_title:
-                    clean_title = TitleCleaner.clean_title(message_title)
-
+                with self.metrics.timer(self.STAGE_SECONDS, stage='clean', domain=domain):
+                    strategy = 'slug'
+                    clean_title = self.slug_clean_title(final_url, analysis)
+                    if not clean_title:
+                        strategy = 'message'
+                        clean_title = self.message_clean_title(parsed)
             if not clean_title:
-                return "❌ Unable to extract product info"
+                strategy = 'none'
 
-            # Extract price from message
-            prices = PriceExtractor.extract_prices(message_text)
-            is_from = 'from' in message_text.lower() or len(prices) > 1
-            price_str = str(min(prices)) if prices else ''
-            formatted_price = PriceExtractor.format_price(price_str, is_from)
+            with self.metrics.timer(self.STAGE_SECONDS, stage='extract', domain=domain):
+                response = self.build_reply(final_url, parsed, clean_title, analysis)
 
-            # Extract pin and size
-            pin = PinDetector.extract_pin(message_text)
-            domain = urlparse(final_url).netloc.lower()
-            is_meesho = 'meesho.com' in domain
-            size = self.extract_sizes(message_text) if is_meesho else "All"
-
-            return ResponseBuilder.build_response(clean_title, final_url, formatted_price, is_meesho, size, pin)
+            self.metrics.observe(self.URL_SECONDS, time.perf_counter() - started, domain=domain, strategy=strategy)
+            return response
 
         except Exception as e:
             logger.error(f"Error processing URL {url}: {e}")
             return None
 
-    def extract_forwarded_title(self, text: str) -> Optional[str]:
+    @staticmethod
+    def forwarded_clean_title(parsed: ParsedMessage) -> str:
+        """Clean title taken from the forwarded message's own lines"""
+        forwarded_title = parsed.forwarded_title
+        if forwarded_title:
+            return TitleCleaner.clean_title(forwarded_title)
+        return ""
+
+    @staticmethod
+    def slug_clean_title(final_url: str, analysis: Optional[URLAnalysis] = None) -> str:
+        """Clean title taken from the URL slug
+
+        Pass the analysis of the URL as resolved: a canonical URL such as Amazon's
+        /dp/<ASIN> has lost its slug, so analysing final_url again finds no title.
+        """
+        # Retailer analyzers know which path segment is the product slug, the last one is a guess
+        if analysis is None:
+            analysis = analyze_url(final_url)
+        slug_title = (analysis and analysis.title) or TitleCleaner.extract_title_from_url_slug(final_url)
+        if slug_title:
+            return TitleCleaner.clean_title(slug_title)
+        return ""
+
+    @staticmethod
+    def message_clean_title(parsed: ParsedMessage) -> str:
+        """Clean title made from the whole message text"""
+        message_title = parsed.message_title
+        if message_title:
+            return TitleCleaner.clean_title(message_title)
+        return ""
+
+    @staticmethod
+    def fallback_clean_title(final_url: str, parsed: ParsedMessage, analysis: Optional[URLAnalysis] = None) -> str:
+        """Clean title from the URL slug, or from the message text as a last resort"""
+        # Strategy 3: URL slug extraction, Strategy 4: message text cleaning
+        return (ReviewCheckkBot.slug_clean_title(final_url, analysis)
+                or ReviewCheckkBot.message_clean_title(parsed))
+
+    @staticmethod
+    def build_reply(final_url: str, parsed: ParsedMessage, clean_title: str = "",
+                    analysis: Optional[URLAnalysis] = None) -> str:
+        """Apply the offline title fallbacks and format the reply for a resolved URL"""
+        if not clean_title:
+            clean_title = ReviewCheckkBot.fallback_clean_title(final_url, parsed, analysis)
+
+        if not clean_title:
+            return "❌ Unable to extract product info"
+
+        # Price, PIN and sizes all come from the message's single parse
+        prices = parsed.price_values
+        is_from = parsed.has_from or len(prices) > 1
+        price_str = str(min(prices)) if prices else ''
+        formatted_price = PriceExtractor.format_price(price_str, is_from)
+
+        domain = urlparse(final_url).netloc.lower()
+        is_meesho = 'meesho.com' in domain
+        size = parsed.sizes if is_meesho else "All"
+
+        return ResponseBuilder.build_response(clean_title, final_url, formatted_price, is_meesho, size, parsed.pin)
+
+    async def scrape_clean_title(self, url: str, page: Optional[bytes] = None, page_url: Optional[str] = None) -> str:
+        """Scrape and clean a product title, reusing cached results for the same product"""
+        key = TitleCleaner.product_key(url)
+        cached = await self.title_cache.aget(key)
+        if cached:
+            return json.loads(cached)['clean']
+
+        # Concurrent requests for the same product share one fetch
+        return await self.scrape_flight.do(key, lambda: self.fetch_clean_title(key, url, page, page_url))
+
+    async def fetch_clean_title(self, key: str, url: str, page: Optional[bytes] = None,
+                                page_url: Optional[str] = None) -> str:
+        """Scrape a product page and store the raw and cleaned title under its product key
+
+        A page head the resolver already read is tried first, so it is not downloaded again.
+        """
+        domain = self.metric_domain(url)
+        scraped_title = None
+        # A head read from some other page (an affiliate interstitial) must not title this product
+        if page is not None and TitleCleaner.product_key(page_url or url) == key:
+            with self.metrics.timer(self.STAGE_SECONDS, stage='parse', domain=domain):
+                scraped_title = await asyncio.to_thread(TitleCleaner.page_title, page, page_url or url)
+        if not scraped_title:
+            # Blocked or failing retailers are left to the slug strategy until they recover
+            if not self.breakers.allow(url):
+                return ""
+            with self.metrics.timer(self.STAGE_SECONDS, stage='scrape', domain=domain):
+                scraped_title = await TitleCleaner.extract_title_from_url(url, self.http, self.breakers)
+        if not scraped_title:
+            return ""
+        with self.metrics.timer(self.STAGE_SECONDS, stage='clean', domain=domain):
+            clean_title = TitleCleaner.clean_title(scraped_title)
+        await self.title_cache.aset(key, json.dumps({'raw': scraped_title, 'clean': clean_title}))
+        return clean_title
+
+    @staticmethod
+    def extract_forwarded_title(text: str) -> Optional[str]:
         """Extract title from forwarded message patterns"""
-        lines = text.split('\n')
-        potential_titles = []
-        for line in lines:
-            line = line.strip()
-            if line and not re.search(r'https?://', line) and len(line) > 5:
-                potential_titles.append(line)
-        if potential_titles:
-            return ' '.join(potential_titles[:2])  # Take first 1-2 lines as title
-        return None
+        return parse_message(text).forwarded_title
 
-    def clean_message_as_title(self, text: str) -> str:
+    @staticmethod
+    def clean_message_as_title(text: str) -> str:
         """Clean message text to use as fallback title"""
-        # Remove URLs
-        text = re.sub(r'https?://\S+', '', text)
-        # Remove extra spaces
-        text = ' '.join(text.split())
-        return text
+        return parse_message(text).message_title
 
-    def extract_sizes(self, text: str) -> str:
+    @staticmethod
+    def extract_sizes(text: str) -> str:
         """Extract sizes from message"""
-        size_pattern = r'size\s*-\s*([\w,\s]+)'
-        match = re.search(size_pattern, text, re.IGNORECASE)
-        if match:
-            sizes = match.group(1).strip().upper()
-            if 'all' in sizes.lower():
-                return 'All'
-            return sizes.replace(' ', '')
-        # Alternative pattern for available sizes
-        sizes_found = re.findall(r'\b(x{0,3}s|x{1,3}l|m)\b', text.upper())
-        if sizes_found:
-            return ', '.join(sorted(set(sizes_found)))
-        # If stock displayed, use that
-        stock_pattern = r'stock\s*:\s*([\w,\s]+)'
-        match = re.search(stock_pattern, text, re.IGNORECASE)
-        if match:
-            return match.group(1).strip().upper()
-        return 'All'
\ No newline at end of file
+        return parse_message(text).sizes
@@ -0,0 +1,429 @@
+import os
+import sys
+import time
+import asyncio
+import struct
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+# Memory tier entry: expiry (uint32 epoch seconds), interned URL prefix id (uint16), then the
+# rest of the value as UTF-8. One bytes object per entry instead of a tuple of str and float
+ENTRY_HEADER = struct.Struct('<IH')
+MAX_EXPIRY = 2 ** 32 - 1
+# Distinct scheme+host prefixes kept per cache, later ones are stored inline
+MAX_PREFIXES = 4096
+
+# Measured cost of an OrderedDict slot plus its 64-bit int key, on top of the entry bytes
+ENTRY_OVERHEAD = 140
+
+
+def hash_key(key: str) -> int:
+    """64-bit hash that stands in for the full key in memory
+
+    At a million live keys the chance of any two colliding is about 3e-8.
+    """
+    return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def split_prefix(value: str) -> Tuple[str, str]:
+    """Split a URL after its scheme and host so the host part can be shared between entries"""
+    scheme_end = value.find('://')
+    if scheme_end < 0 or scheme_end > 8:
+        return '', value
+    path_start = value.find('/', scheme_end + 3)
+    if path_start < 0:
+        return value, ''
+    return value[:path_start], value[path_start:]
+
+
+class LRUCache:
+    """In-process LRU cache with per-entry expiry, bounded by entry count and estimated bytes
+
+    Keys are kept as 64-bit hashes and values as packed bytes records, with the
+    scheme and host of URL values interned in a shared prefix table.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl: float = 86400, max_bytes: Optional[int] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.entries: 'OrderedDict[int, bytes]' = OrderedDict()
+        self.prefixes = ['']
+        self.prefix_ids: Dict[str, int] = {'': 0}
+        self.bytes = 0
+        self.prefix_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def pack(self, value: str, expires_at: float) -> bytes:
+        """Encode a value and its expiry as one entry record"""
+        prefix, rest = split_prefix(value)
+        prefix_id = self.prefix_ids.get(prefix)
+        if prefix_id is None:
+            if len(self.prefixes) >= MAX_PREFIXES:
+                prefix_id, rest = 0, value
+            else:
+                prefix_id = self.prefix_ids[prefix] = len(self.prefixes)
+                self.prefixes.append(sys.intern(prefix))
+                # The string itself plus its list and dict slots
+                self.prefix_bytes += sys.getsizeof(prefix) + 2 * ENTRY_OVERHEAD
+        expiry = min(max(int(expires_at), 0), MAX_EXPIRY)
+        return ENTRY_HEADER.pack(expiry, prefix_id) + rest.encode('utf-8')
+
+    def unpack(self, entry: bytes) -> Tuple[str, int]:
+        """Decode an entry record into (value, expiry)"""
+        expiry, prefix_id = ENTRY_HEADER.unpack_from(entry)
+        return self.prefixes[prefix_id] + entry[ENTRY_HEADER.size:].decode('utf-8'), expiry
+
+    @staticmethod
+    def entry_size(entry: bytes) -> int:
+        return sys.getsizeof(entry) + ENTRY_OVERHEAD
+
+    def get(self, key: str) -> Optional[str]:
+        """Return a live value and mark it most recently used"""
+        hashed = hash_key(key)
+        entry = self.entries.get(hashed)
+        if entry is None:
+            self.misses += 1
+            return None
+        value, expires_at = self.unpack(entry)
+        if expires_at < time.time():
+            self.remove(hashed)
+            self.misses += 1
+            return None
+        self.entries.move_to_end(hashed)
+        self.hits += 1
+        return value
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None, expires_at: Optional[float] = None):
+        """Store a value, evicting the least recently used entries over either cap"""
+        if expires_at is None:
+            expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        hashed = hash_key(key)
+        self.remove(hashed)
+        entry = self.pack(value, expires_at)
+        self.entries[hashed] = entry
+        self.bytes += self.entry_size(entry)
+        while self.entries and (len(self.entries) > self.max_entries or self.over_budget()):
+            _, evicted = self.entries.popitem(last=False)
+            self.bytes -= self.entry_size(evicted)
+            self.evictions += 1
+
+    def over_budget(self) -> bool:
+        return self.max_bytes is not None and self.bytes + self.prefix_bytes > self.max_bytes
+
+    def remove(self, hashed: int):
+        entry = self.entries.pop(hashed, None)
+        if entry is not None:
+            self.bytes -= self.entry_size(entry)
+
+    def delete(self, key: str):
+        """Drop a key if present"""
+        self.remove(hash_key(key))
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def stats(self) -> Dict[str, int]:
+        """Entry count, estimated bytes and hit/miss counters"""
+        return {'entries': len(self.entries), 'bytes': self.bytes + self.prefix_bytes,
+                'prefixes': len(self.prefixes) - 1, 'hits': self.hits,
+                'misses': self.misses, 'evictions': self.evictions}
+
+
+class SQLiteCache:
+    """On-disk key/value store with expiry that survives restarts
+
+    WAL mode lets several worker processes on one host share the same file. Reads never
+    wait on writers there, but a write can wait up to the busy timeout for another
+    process's, so TieredCache.aset writes from a thread.
+    """
+
+    ERRORS: Tuple[type, ...] = (sqlite3.Error,)
+    # A local file, fast enough to read on the event loop
+    REMOTE = False
+
+    def __init__(self, path: str, table: str, max_entries: int = 200000, ttl: float = 7 * 86400):
+        if not table.isidentifier():
+            raise ValueError(f"Invalid cache table name: {table}")
+        self.path = path
+        self.table = table
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._writes = 0
+        # One connection used from the event loop and from to_thread writes
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute(
+            f'CREATE TABLE IF NOT EXISTS {table} '
+            '(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)'
+        )
+        self.conn.execute(f'CREATE INDEX IF NOT EXISTS {table}_expires ON {table} (expires_at)')
+
+    def get(self, key: str) -> Optional[Tuple[str, float]]:
+        """Return (value, expires_at) for a live entry"""
+        with self.lock:
+            row = self.conn.execute(
+                f'SELECT value, expires_at FROM {self.table} WHERE key = ?', (key,)
+            ).fetchone()
+        if row is None or row[1] < time.time():
+            self.misses += 1
+            return None
+        self.hits += 1
+        return row[0], row[1]
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None) -> float:
+        """Store a value and return its expiry timestamp"""
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        with self.lock:
+            self.conn.execute(
+                f'INSERT OR REPLACE INTO {self.table} (key, value, expires_at) VALUES (?, ?, ?)',
+                (key, value, expires_at)
+            )
+            self._writes += 1
+            # Checking the size on every write would cost a table scan, do it periodically
+            if self._writes % 500 == 0:
+                self.prune()
+        return expires_at
+
+    def delete(self, key: str):
+        """Drop a key if present"""
+        with self.lock:
+            self.conn.execute(f'DELETE FROM {self.table} WHERE key = ?', (key,))
+
+    def prune(self):
+        """Remove expired rows, then the soonest-expiring rows over the size cap"""
+        now = time.time()
+        with self.lock:
+            removed = self.conn.execute(f'DELETE FROM {self.table} WHERE expires_at < ?', (now,)).rowcount
+            count = self.conn.execute(f'SELECT COUNT(*) FROM {self.table}').fetchone()[0]
+            if count > self.max_entries:
+                removed += self.conn.execute(
+                    f'DELETE FROM {self.table} WHERE key IN '
+                    f'(SELECT key FROM {self.table} ORDER BY expires_at LIMIT ?)',
+                    (count - self.max_entries,)
+                ).rowcount
+        self.evictions += removed
+
+    def __len__(self) -> int:
+        with self.lock:
+            return self.conn.execute(f'SELECT COUNT(*) FROM {self.table}').fetchone()[0]
+
+    def close(self):
+        """Close the database connection"""
+        with self.lock:
+            self.conn.close()
+
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss counters for the disk tier"""
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
+
+
+def redis_errors(client=None) -> Tuple[type, ...]:
+    """Exceptions a Redis call can raise; an injected client works without the redis package"""
+    try:
+        import redis
+    except ImportError:
+        if client is None:
+            raise
+        return (OSError,)
+    return (redis.RedisError, OSError)
+
+
+class RedisCache:
+    """Key/value store with expiry on a Redis-compatible server, shared by workers on any host
+
+    Needs the optional redis package. Keys are namespaced by the cache name.
+    """
+
+    # A network round trip, TieredCache.aget and aset make it from a thread
+    REMOTE = True
+
+    def __init__(self, url: str, namespace: str, ttl: float = 7 * 86400, client=None):
+        self.ERRORS = redis_errors(client)
+        self.namespace = namespace
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        # The server evicts on its own, evictions stays 0 and is kept for the stats shape
+        self.evictions = 0
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url, socket_timeout=1.0)
+        self.client = client
+        self.client.ping()
+
+    def key(self, key: str) -> str:
+        return f'{self.namespace}:{key}'
+
+    def get(self, key: str) -> Optional[Tuple[str, float]]:
+        """Return (value, expires_at) for a live entry"""
+        pipe = self.client.pipeline(transaction=False)
+        pipe.get(self.key(key))
+        pipe.pttl(self.key(key))
+        value, pttl = pipe.execute()
+        if value is None or pttl is None or pttl < 0:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value.decode('utf-8'), time.time() + pttl / 1000
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None) -> float:
+        """Store a value and return its expiry timestamp"""
+        ttl = self.ttl if ttl is None else ttl
+        self.client.set(self.key(key), value.encode('utf-8'), px=max(int(ttl * 1000), 1))
+        return time.time() + ttl
+
+    def delete(self, key: str):
+        """Drop a key if present"""
+        self.client.delete(self.key(key))
+
+    def close(self):
+        """Close the connection pool"""
+        self.client.close()
+
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss counters for the shared tier"""
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
+
+
+class TieredCache:
+    """In-process LRU in front of a persistent store shared between worker processes
+
+    The persistent tier is SQLite by default, or a Redis-compatible server when
+    CACHE_BACKEND=redis. Both expose get/set/delete/close/stats and an ERRORS tuple.
+    """
+
+    def __init__(self, name: str, path: Optional[str] = None, ttl: float = 7 * 86400,
+                 memory_entries: int = 10000, disk_entries: int = 200000, backend=None,
+                 memory_bytes: Optional[int] = None):
+        self.name = name
+        self.ttl = ttl
+        self.memory = LRUCache(max_entries=memory_entries, ttl=ttl, max_bytes=memory_bytes)
+        self.disk = backend
+        if backend is None and path:
+            try:
+                self.disk = SQLiteCache(path, name, max_entries=disk_entries, ttl=ttl)
+            except sqlite3.Error as e:
+                logger.warning(f"Cache {name} running memory-only, cannot open {path}: {e}")
+
+    @classmethod
+    def from_env(cls, name: str, ttl: float, memory_entries: int = 10000,
+                 disk_entries: int = 200000, memory_mb: float = 16) -> 'TieredCache':
+        """Build a cache stored in CACHE_DB_PATH (empty to keep it memory-only)
+
+        The memory tier is capped at memory_mb megabytes, or CACHE_MEMORY_MB for every cache.
+
+        CACHE_BACKEND=redis stores it at CACHE_REDIS_URL instead, falling back to
+        SQLite when the server cannot be reached or the redis package is missing.
+        """
+        path = os.environ.get('CACHE_DB_PATH', 'cache.db')
+        backend = None
+        if os.environ.get('CACHE_BACKEND', 'sqlite').lower() == 'redis':
+            url = os.environ.get('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+            try:
+                backend = RedisCache(url, name, ttl=ttl)
+            except Exception as e:
+                logger.warning(f"Cache {name} falling back to SQLite, cannot use Redis at {url}: {e}")
+        memory_mb = float(os.environ.get('CACHE_MEMORY_MB', memory_mb))
+        return cls(name, path, ttl=ttl, memory_entries=memory_entries, disk_entries=disk_entries,
+                   backend=backend, memory_bytes=int(memory_mb * 1024 * 1024))
+
+    def get(self, key: str) -> Optional[str]:
+        """Look up the memory tier, then the disk tier, promoting disk hits"""
+        value = self.memory.get(key)
+        if value is not None or self.disk is None:
+            return value
+        return self.promote(key, self.read_disk(self.disk, key))
+
+    async def aget(self, key: str) -> Optional[str]:
+        """get() for the event loop, reading a remote persistent tier from a thread"""
+        value = self.memory.get(key)
+        disk = self.disk
+        if value is not None or disk is None:
+            return value
+        if disk.REMOTE:
+            row = await asyncio.to_thread(self.read_disk, disk, key)
+        else:
+            row = self.read_disk(disk, key)
+        return self.promote(key, row)
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None):
+        """Write through to both tiers"""
+        expires_at = self.write_disk(self.disk, key, value, ttl) if self.disk is not None else None
+        self.memory.set(key, value, ttl=ttl, expires_at=expires_at)
+
+    async def aset(self, key: str, value: str, ttl: Optional[float] = None):
+        """set() for the event loop, writing the persistent tier from a thread
+
+        Both tiers can stall a write: Redis on the network, a shared SQLite file on
+        another process's write lock.
+        """
+        disk = self.disk
+        expires_at = None
+        if disk is not None:
+            expires_at = await asyncio.to_thread(self.write_disk, disk, key, value, ttl)
+        self.memory.set(key, value, ttl=ttl, expires_at=expires_at)
+
+    def read_disk(self, disk, key: str) -> Optional[Tuple[str, float]]:
+        try:
+            return disk.get(key)
+        except disk.ERRORS as e:
+            logger.warning(f"Cache {self.name} read failed: {e}")
+            return None
+
+    def write_disk(self, disk, key: str, value: str, ttl: Optional[float]) -> Optional[float]:
+        try:
+            return disk.set(key, value, ttl)
+        except disk.ERRORS as e:
+            logger.warning(f"Cache {self.name} write failed: {e}")
+            return None
+
+    def promote(self, key: str, row: Optional[Tuple[str, float]]) -> Optional[str]:
+        """Copy a disk tier hit into the memory tier"""
+        if row is None:
+            return None
+        self.memory.set(key, row[0], expires_at=row[1])
+        return row[0]
+
+    def delete(self, key: str):
+        """Drop a key from both tiers"""
+        self.memory.delete(key)
+        if self.disk is not None:
+            try:
+                self.disk.delete(key)
+            except self.disk.ERRORS as e:
+                logger.warning(f"Cache {self.name} delete failed: {e}")
+
+    def close(self):
+        """Close the disk tier"""
+        if self.disk is not None:
+            self.disk.close()
+            self.disk = None
+
+    def stats(self) -> Dict[str, int]:
+        """Combined hit/miss counters for both tiers"""
+        disk = self.disk.stats() if self.disk is not None else {'hits': 0, 'misses': 0, 'evictions': 0}
+        memory = self.memory.stats()
+        return {
+            'memory_entries': memory['entries'],
+            'memory_bytes': memory['bytes'],
+            'memory_hits': memory['hits'],
+            'memory_evictions': memory['evictions'],
+            'disk_hits': disk['hits'],
+            'disk_evictions': disk['evictions'],
+            'misses': disk['misses'] if self.disk is not None else memory['misses'],
+        }
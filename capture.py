@@ -0,0 +1,104 @@
+import os
+import gzip
+import json
+import time
+import zlib
+import logging
+from typing import Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+# Record kinds
+MESSAGE = 'm'  # incoming message text
+HOP = 'h'      # one redirect hop while resolving a short link
+PAGE = 'p'     # HTML read from a page, a redirect page head or a product page
+REPLY = 'o'    # what process_url answered for one link of a message
+
+
+class TrafficRecorder:
+    """Opt-in, append-only log of what the bot saw, fetched and answered, for replay
+
+    Records are JSON lines in a gzip file opened for append, so each run adds a gzip
+    member and readers see one stream. Page bytes are stored as latin-1 text, which
+    round-trips every byte and compresses far better than base64.
+    """
+
+    def __init__(self, path: str, flush_every: int = 100, max_page_bytes: int = 512 * 1024):
+        self.path = path
+        self.flush_every = flush_every
+        self.max_page_bytes = max_page_bytes
+        self.file = gzip.open(path, 'at', encoding='utf-8', compresslevel=6)
+        self.records = 0
+        self.failures = 0
+        logger.info(f"Capturing traffic to {path}")
+
+    @classmethod
+    def from_env(cls) -> Optional['TrafficRecorder']:
+        """Recorder writing to CAPTURE_PATH, None when capture is off
+
+        Processes must not share a file; in a cluster put {pid} in the path.
+        """
+        path = os.environ.get('CAPTURE_PATH')
+        if not path:
+            return None
+        path = path.replace('{pid}', str(os.getpid()))
+        try:
+            return cls(path)
+        except OSError as e:
+            logger.warning(f"Traffic capture disabled, cannot open {path}: {e}")
+            return None
+
+    def write(self, kind: str, **fields):
+        """Append one record, never letting a capture problem break the request"""
+        if self.file is None:
+            return
+        fields['k'] = kind
+        fields['t'] = round(time.time(), 3)
+        try:
+            self.file.write(json.dumps(fields, ensure_ascii=False, separators=(',', ':')) + '\n')
+            self.records += 1
+            if self.records % self.flush_every == 0:
+                self.file.flush()
+        except (OSError, ValueError) as e:
+            self.failures += 1
+            logger.warning(f"Traffic capture write failed: {e}")
+
+    def message(self, chat_id: int, message_id: int, text: str):
+        self.write(MESSAGE, chat=chat_id, id=message_id, text=text)
+
+    def hop(self, url: str, status: int, location: Optional[str]):
+        self.write(HOP, url=url, status=status, location=location)
+
+    def page(self, url: str, status: int, content: bytes):
+        self.write(PAGE, url=url, status=status, body=content[:self.max_page_bytes].decode('latin-1'))
+
+    def reply(self, chat_id: int, message_id: int, index: int, url: str, reply: Optional[str]):
+        self.write(REPLY, chat=chat_id, id=message_id, i=index, url=url, reply=reply)
+
+    def close(self):
+        """Flush and close the log"""
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def stats(self) -> Dict[str, int]:
+        return {'records': self.records, 'failures': self.failures}
+
+
+def read_log(path: str) -> Iterator[Dict]:
+    """Records from a capture log, stopping quietly at a member cut short by a crash"""
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        try:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    # A partly flushed last line
+                    return
+        except (EOFError, gzip.BadGzipFile, zlib.error) as e:
+            logger.warning(f"Capture log {path} ends early: {e}")
+
+
+def page_bytes(record: Dict) -> bytes:
+    """The page content of a PAGE record"""
+    return record['body'].encode('latin-1')
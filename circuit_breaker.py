@@ -0,0 +1,167 @@
+import os
+import time
+import logging
+from typing import Callable, Dict
+
+from cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+HALF_OPEN = 'half_open'
+OPEN = 'open'
+
+# Gauge value exported for each state
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class BlockedPage(Exception):
+    """A retailer answered with a block, CAPTCHA or rate-limit page instead of the product"""
+
+
+class CircuitBreaker:
+    """Failure counter for one domain that stops scraping it for a cool-down once tripped
+
+    Opens after failure_threshold failures or block_threshold block pages in a row. When
+    the cool-down ends a single probe is let through: success closes the breaker, failure
+    opens it again with the cool-down doubled, up to max_cooldown.
+    """
+
+    def __init__(self, failure_threshold: int = 5, block_threshold: int = 2,
+                 cooldown: float = 60.0, max_cooldown: float = 900.0):
+        self.failure_threshold = failure_threshold
+        self.block_threshold = block_threshold
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.cooldown = cooldown
+        self.state = CLOSED
+        self.failures = 0
+        self.blocks = 0
+        self.opened_at = 0.0
+        self.probe_started = 0.0
+        self.trips = 0
+        self.rejected = 0
+
+    def allow(self, now: float) -> bool:
+        """Whether a scrape may go ahead, letting one probe through after the cool-down"""
+        if self.state == CLOSED:
+            return True
+        # A probe that never reported back (cancelled, say) is given up on after a cool-down
+        if now - max(self.opened_at, self.probe_started) >= self.cooldown:
+            self.state = HALF_OPEN
+            self.probe_started = now
+            return True
+        self.rejected += 1
+        return False
+
+    def success(self):
+        self.state = CLOSED
+        self.failures = 0
+        self.blocks = 0
+        self.cooldown = self.base_cooldown
+
+    def failure(self, blocked: bool, now: float):
+        self.failures += 1
+        self.blocks += blocked
+        if self.state == HALF_OPEN:
+            self.cooldown = min(self.cooldown * 2, self.max_cooldown)
+            self.trip(now)
+        elif self.state == CLOSED and (self.failures >= self.failure_threshold
+                                       or self.blocks >= self.block_threshold):
+            self.trip(now)
+
+    def trip(self, now: float):
+        self.state = OPEN
+        self.opened_at = now
+        self.trips += 1
+
+
+class DomainBreakers:
+    """Per-domain circuit breakers for product page scraping, plus a negative cache of failed URLs"""
+
+    def __init__(self, domain_key: Callable[[str], str], failure_threshold: int = 5, block_threshold: int = 2,
+                 cooldown: float = 60.0, max_cooldown: float = 900.0, negative_ttl: float = 600.0,
+                 negative_entries: int = 5000):
+        self.domain_key = domain_key
+        self.failure_threshold = failure_threshold
+        self.block_threshold = block_threshold
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.failed_urls = LRUCache(max_entries=negative_entries, ttl=negative_ttl)
+        self.negative_skips = 0
+
+    @classmethod
+    def from_env(cls, domain_key: Callable[[str], str]) -> 'DomainBreakers':
+        """Build from BREAKER_FAILURES, BREAKER_BLOCKS, BREAKER_COOLDOWN and NEGATIVE_CACHE_TTL"""
+        return cls(
+            domain_key,
+            failure_threshold=int(os.environ.get('BREAKER_FAILURES', 5)),
+            block_threshold=int(os.environ.get('BREAKER_BLOCKS', 2)),
+            cooldown=float(os.environ.get('BREAKER_COOLDOWN', 60.0)),
+            negative_ttl=float(os.environ.get('NEGATIVE_CACHE_TTL', 600.0)),
+        )
+
+    def breaker(self, domain: str) -> CircuitBreaker:
+        """Breaker for a domain key, creating it on first use"""
+        breaker = self.breakers.get(domain)
+        if breaker is None:
+            breaker = self.breakers[domain] = CircuitBreaker(
+                self.failure_threshold, self.block_threshold, self.cooldown, self.max_cooldown
+            )
+        return breaker
+
+    def allow(self, url: str) -> bool:
+        """Whether this URL is worth scraping now"""
+        if self.failed_urls.get(url) is not None:
+            self.negative_skips += 1
+            return False
+        domain = self.domain_key(url)
+        breaker = self.breaker(domain)
+        state = breaker.state
+        allowed = breaker.allow(time.monotonic())
+        if breaker.state != state:
+            logger.info(f"Circuit breaker for {domain} {state} -> {breaker.state}, probing")
+        return allowed
+
+    def record_success(self, url: str):
+        domain = self.domain_key(url)
+        breaker = self.breaker(domain)
+        state = breaker.state
+        breaker.success()
+        if state != CLOSED:
+            logger.info(f"Circuit breaker for {domain} {state} -> {CLOSED}")
+
+    def record_failure(self, url: str, blocked: bool = False):
+        """Count a failed scrape against the URL's domain and skip the URL for a while"""
+        self.failed_urls.set(url, 'blocked' if blocked else 'failed')
+        domain = self.domain_key(url)
+        breaker = self.breaker(domain)
+        state = breaker.state
+        breaker.failure(blocked, time.monotonic())
+        if breaker.state != state:
+            logger.warning(f"Circuit breaker for {domain} {state} -> {breaker.state} after "
+                           f"{breaker.failures} failures ({breaker.blocks} blocked), "
+                           f"skipping scrapes for {breaker.cooldown:.0f}s")
+
+    def stats(self) -> Dict[str, float]:
+        """Open breaker count and negative cache counters"""
+        return {
+            'open': sum(1 for b in self.breakers.values() if b.state == OPEN),
+            'half_open': sum(1 for b in self.breakers.values() if b.state == HALF_OPEN),
+            'negative_entries': len(self.failed_urls),
+            'negative_skips': self.negative_skips,
+        }
+
+    def domain_stats(self) -> Dict[str, Dict[str, float]]:
+        """Per domain state (0 closed, 1 half open, 2 open), trips and skipped scrapes"""
+        return {
+            domain: {
+                'state': STATE_VALUES[breaker.state],
+                'failures': breaker.failures,
+                'trips': breaker.trips,
+                'rejected': breaker.rejected,
+                'cooldown': breaker.cooldown,
+            }
+            for domain, breaker in self.breakers.items()
+        }
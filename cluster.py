@@ -0,0 +1,141 @@
+"""Run the bot as one Telegram intake process plus any number of worker processes.
+
+Usage: python cluster.py intake
+       python cluster.py worker [--concurrency N]
+
+The intake process polls Telegram and pushes each message with links (or a
+photo to OCR) onto the job broker named by JOB_BROKER (sqlite or redis).
+Worker processes pop jobs, resolve and scrape the links and reply straight to
+the chat through the Bot API. All processes share the URL, title and OCR
+caches through CACHE_DB_PATH, or CACHE_BACKEND=redis across hosts. Set
+CLUSTER_WORKERS to the number of workers so they split the per-domain rate
+limits instead of each using the full budget. With METRICS_PORT set, each
+process serves /metrics on the first free port from METRICS_PORT up to
+METRICS_PORT_SPAN (default 32) ports above it.
+"""
+import os
+import sys
+import signal
+import asyncio
+import logging
+import argparse
+from typing import Dict, List, Optional
+
+from telegram import Bot
+
+from bot import ReviewCheckkBot
+from message_parser import parse_message
+
+logger = logging.getLogger(__name__)
+
+
+class RemotePhoto:
+    """A photo from a job, downloadable the way a telegram.PhotoSize is"""
+
+    def __init__(self, bot: Bot, file_id: str, file_unique_id: str):
+        self.bot = bot
+        self.file_id = file_id
+        self.file_unique_id = file_unique_id
+
+    async def get_file(self):
+        return await self.bot.get_file(self.file_id)
+
+
+class RemoteMessage:
+    """The parts of telegram.Message that the reply path uses, rebuilt from a job"""
+
+    def __init__(self, bot: Bot, job: Dict):
+        self.bot = bot
+        self.chat_id = job['chat_id']
+        self.message_id = job['message_id']
+        photo = job.get('photo')
+        self.photo: Optional[List[RemotePhoto]] = (
+            [RemotePhoto(bot, photo['file_id'], photo['file_unique_id'])] if photo else None
+        )
+
+    async def reply_text(self, text: str, **kwargs):
+        return await self.bot.send_message(self.chat_id, text, reply_to_message_id=self.message_id, **kwargs)
+
+    async def reply_photo(self, photo, caption: str = '', **kwargs):
+        return await self.bot.send_photo(self.chat_id, photo, caption=caption,
+                                         reply_to_message_id=self.message_id, **kwargs)
+
+
+async def run_job(bot: ReviewCheckkBot, job: Dict):
+    """Answer one job the same way the single-process bot answers a message"""
+    message = RemoteMessage(bot.application.bot, job)
+    if job['text']:
+        await bot.process_message(message, parse_message(job['text']))
+    else:
+        await bot.process_photo(message)
+
+
+async def run_worker(bot: ReviewCheckkBot, concurrency: int, poll_timeout: float = 5.0):
+    """Pop and answer jobs, at most concurrency at a time, until SIGTERM or SIGINT"""
+    if bot.broker is None:
+        raise RuntimeError("Worker mode needs JOB_BROKER set to sqlite or redis")
+
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stopping.set)
+
+    slots = asyncio.Semaphore(concurrency)
+    running = set()
+
+    async def run(job: Dict):
+        try:
+            await run_job(bot, job)
+        except Exception as e:
+            logger.error(f"Job for message {job.get('message_id')} failed: {e}")
+        finally:
+            slots.release()
+
+    async with bot.application.bot:
+        await bot.startup(bot.application)
+        logger.info(f"Worker started, {concurrency} jobs at a time")
+        try:
+            while not stopping.is_set():
+                await slots.acquire()
+                try:
+                    job = await bot.broker.pop(poll_timeout)
+                except bot.broker.ERRORS as e:
+                    logger.warning(f"Job broker unavailable: {e}")
+                    job = None
+                    await asyncio.sleep(poll_timeout)
+                if job is None:
+                    slots.release()
+                    continue
+                task = asyncio.create_task(run(job))
+                running.add(task)
+                task.add_done_callback(running.discard)
+            # Let jobs already taken off the broker finish, nobody else will answer them
+            if running:
+                await asyncio.wait(running, timeout=bot.message_deadline)
+        finally:
+            await bot.shutdown(bot.application)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('role', choices=['intake', 'worker'])
+    parser.add_argument('--concurrency', type=int, default=int(os.environ.get('QUEUE_WORKERS', 8)),
+                        help='jobs a worker runs at once (default: QUEUE_WORKERS or 8)')
+    args = parser.parse_args()
+
+    # Every process of the cluster may run on one host, so none can own METRICS_PORT outright
+    os.environ.setdefault('METRICS_PORT_SPAN', '32')
+    bot = ReviewCheckkBot(os.environ['TELEGRAM_BOT_TOKEN'])
+
+    if args.role == 'intake':
+        if bot.broker is None:
+            logger.warning("JOB_BROKER is not set, the intake process will answer every message itself")
+        bot.application.run_polling()
+        return
+
+    bot.http.rate_limiter.share(int(os.environ.get('CLUSTER_WORKERS', 1)))
+    asyncio.run(run_worker(bot, args.concurrency))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
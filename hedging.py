@@ -0,0 +1,181 @@
+import os
+import time
+import random
+import asyncio
+import logging
+from collections import deque
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+# An attempt is called with the user agent it should send
+Attempt = Callable[[str], Awaitable[T]]
+
+
+class LatencyWindow:
+    """Rolling window of the most recent request latencies"""
+
+    def __init__(self, size: int = 200):
+        self.samples = deque(maxlen=size)
+
+    def add(self, seconds: float):
+        self.samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Nearest-rank percentile of the window, None when it is empty"""
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class Hedger:
+    """Per-domain adaptive timeouts plus hedged second attempts under a global budget
+
+    Once a domain has min_samples latencies, its timeout becomes timeout_multiplier x p99,
+    clamped between min_timeout and max_timeout_factor x the caller's default, and an
+    attempt still running at p90 gets a hedge with a different user agent. Each request
+    earns hedge_ratio of a hedge token, so hedges stay under that fraction of traffic.
+    """
+
+    def __init__(self, hedge_ratio: float = 0.1, hedge_burst: int = 10, window: int = 200,
+                 min_samples: int = 20, timeout_multiplier: float = 3.0, min_timeout: float = 1.0,
+                 max_timeout_factor: float = 2.0):
+        self.hedge_ratio = hedge_ratio
+        self.hedge_burst = hedge_burst
+        self.window_size = window
+        self.min_samples = min_samples
+        self.timeout_multiplier = timeout_multiplier
+        self.min_timeout = min_timeout
+        self.max_timeout_factor = max_timeout_factor
+        self.windows: Dict[Tuple[str, str], LatencyWindow] = {}
+        self.tokens = float(hedge_burst)
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.denied = 0
+        self.timeouts = 0
+
+    @classmethod
+    def from_env(cls) -> 'Hedger':
+        """Build a hedger from HEDGE_RATIO (0 disables hedging) and HEDGE_MIN_SAMPLES"""
+        return cls(
+            hedge_ratio=float(os.environ.get('HEDGE_RATIO', 0.1)),
+            min_samples=int(os.environ.get('HEDGE_MIN_SAMPLES', 20)),
+        )
+
+    def window(self, kind: str, domain: str) -> LatencyWindow:
+        """Latency window for one kind of request to one domain"""
+        key = (kind, domain)
+        window = self.windows.get(key)
+        if window is None:
+            window = self.windows[key] = LatencyWindow(self.window_size)
+        return window
+
+    def timeout(self, window: LatencyWindow, default: float) -> float:
+        """Adaptive timeout for a domain, the default until enough samples are in"""
+        if len(window.samples) < self.min_samples:
+            return default
+        adaptive = window.percentile(0.99) * self.timeout_multiplier
+        return min(max(adaptive, self.min_timeout), default * self.max_timeout_factor)
+
+    def hedge_delay(self, window: LatencyWindow) -> Optional[float]:
+        """How long to wait before hedging, None while the domain has too few samples"""
+        if not self.hedge_ratio or len(window.samples) < self.min_samples:
+            return None
+        return window.percentile(0.90)
+
+    def take_hedge_token(self) -> bool:
+        """Spend one hedge from the global budget if there is one left"""
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        self.denied += 1
+        return False
+
+    async def run(self, kind: str, domain: str, attempt: Attempt, default_timeout: float,
+                  user_agents: List[str], primary_agent: Optional[str] = None,
+                  before_hedge: Optional[Callable[[], Awaitable]] = None) -> T:
+        """Run attempt under the domain's timeout, hedging once if it is slower than p90
+
+        Returns the first successful result. Raises the last attempt's error when all
+        attempts fail, or asyncio.TimeoutError when none finished within the timeout.
+        """
+        window = self.window(kind, domain)
+        timeout = self.timeout(window, default_timeout)
+        delay = self.hedge_delay(window)
+        self.requests += 1
+        self.tokens = min(self.hedge_burst, self.tokens + self.hedge_ratio)
+
+        primary_agent = primary_agent or random.choice(user_agents)
+        started = time.monotonic()
+        deadline = started + timeout
+        # task: (started_at, is_hedge)
+        tasks: Dict[asyncio.Future, Tuple[float, bool]] = {
+            asyncio.ensure_future(attempt(primary_agent)): (started, False)
+        }
+
+        async def hedge(agent: str) -> T:
+            if before_hedge is not None:
+                await before_hedge()
+            return await attempt(agent)
+
+        try:
+            if delay is not None and delay < timeout:
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+                if not done and self.take_hedge_token():
+                    agent = random.choice([ua for ua in user_agents if ua != primary_agent] or user_agents)
+                    tasks[asyncio.ensure_future(hedge(agent))] = (time.monotonic(), True)
+                    self.hedges += 1
+
+            error: Optional[BaseException] = None
+            while tasks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                done, _ = await asyncio.wait(tasks, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    break
+                for task in done:
+                    attempt_started, is_hedge = tasks.pop(task)
+                    if task.exception() is None:
+                        window.add(time.monotonic() - attempt_started)
+                        self.hedge_wins += is_hedge
+                        return task.result()
+                    error = task.exception()
+
+            if not tasks and error is not None:
+                raise error
+            # Count the timeout as a sample so a domain that slowed down earns a longer timeout
+            window.add(timeout)
+            self.timeouts += 1
+            raise asyncio.TimeoutError(f"{kind} to {domain} timed out after {timeout:.1f}s")
+
+        finally:
+            for task in tasks:
+                task.cancel()
+                # Losing attempts may still fail before the cancel lands, swallow that
+                task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+    def stats(self) -> Dict[str, float]:
+        """Global hedging counters and the remaining budget"""
+        return {
+            'requests': self.requests,
+            'hedges': self.hedges,
+            'hedge_wins': self.hedge_wins,
+            'hedges_denied': self.denied,
+            'timeouts': self.timeouts,
+            'budget_tokens': round(self.tokens, 2),
+        }
+
+    def domain_stats(self) -> Dict[str, Dict[str, float]]:
+        """Per domain p50/p90 latency and current timeout for each request kind"""
+        stats: Dict[str, Dict[str, float]] = {}
+        for (kind, domain), window in self.windows.items():
+            row = stats.setdefault(domain, {})
+            row[f'{kind}_samples'] = len(window.samples)
+            row[f'{kind}_p50'] = window.percentile(0.50) or 0.0
+            row[f'{kind}_p90'] = window.percentile(0.90) or 0.0
+        return stats
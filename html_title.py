@@ -0,0 +1,185 @@
+import re
+import logging
+from typing import Optional, List, Dict, Tuple
+
+from lxml import etree
+
+logger = logging.getLogger(__name__)
+
+# (slot, tag or None for any tag, attribute, value); class values match any class token
+Matcher = Tuple[str, Optional[str], str, str]
+
+HEAD_MATCHERS: List[Matcher] = [
+    ('og_title', 'meta', 'property', 'og:title'),
+    ('twitter_title', 'meta', 'name', 'twitter:title'),
+    ('title', 'title', '', ''),
+]
+
+DEEP_MATCHERS: List[Matcher] = [
+    ('h1', 'h1', '', ''),
+]
+
+# Site-specific selectors in the order their candidates are appended
+SITE_MATCHERS: Dict[str, List[Matcher]] = {
+    'meesho': [('meesho_title', 'span', 'class', 'Text__StyledText-sc-oo0kvp-0')],
+    'flipkart': [
+        ('B_NuCI', 'span', 'class', 'B_NuCI'),
+        ('x2cTzZ', 'h1', 'class', 'x2cTzZ'),
+        ('VU-ZEz', 'span', 'class', 'VU-ZEz'),
+    ],
+    'amazon': [('productTitle', 'span', 'id', 'productTitle')],
+    'wishlink': [
+        ('h1', 'h1', '', ''),
+        ('.product-title', None, 'class', 'product-title'),
+        ('.title', None, 'class', 'title'),
+        ('#title', None, 'id', 'title'),
+        ('.product-name', None, 'class', 'product-name'),
+    ],
+}
+
+# Slots read from an attribute rather than the element text
+ATTRIBUTE_SLOTS = {'og_title': 'content', 'twitter_title': 'content'}
+
+SKIP_TEXT_TAGS = {'script', 'style', 'template'}
+
+CHARSET_PATTERN = re.compile(rb'<meta[^>]+charset=["\']?([\w-]+)', re.IGNORECASE)
+
+
+def site_for_domain(domain: str) -> Optional[str]:
+    """Map a domain to its site-specific selector set"""
+    if 'meesho.com' in domain:
+        return 'meesho'
+    if 'flipkart.com' in domain or 'fkrt' in domain:
+        return 'flipkart'
+    if 'amazon.in' in domain:
+        return 'amazon'
+    if 'wishlink.com' in domain or 'extp.in' in domain or 'faym.co' in domain:
+        return 'wishlink'
+    return None
+
+
+class StopParsing(Exception):
+    """Raised by the collector once every candidate it needs has been seen"""
+
+
+class TitleCollector:
+    """lxml parser target that gathers every title candidate in a single pass"""
+
+    def __init__(self, matchers: List[Matcher], stop_at_body: bool):
+        self.matchers = matchers
+        self.stop_at_body = stop_at_body
+        self.found: Dict[str, Optional[str]] = {}
+        self.open: Dict[str, Tuple[int, List[str]]] = {}
+        self.depth = 0
+        self.skip_depth = 0
+
+    def start(self, tag: str, attrib: Dict[str, str]):
+        if self.stop_at_body and tag == 'body':
+            raise StopParsing()
+        self.depth += 1
+        if tag in SKIP_TEXT_TAGS:
+            self.skip_depth += 1
+
+        for slot, match_tag, attr, value in self.matchers:
+            if slot in self.found or slot in self.open:
+                continue
+            if match_tag is not None and tag != match_tag:
+                continue
+            if attr:
+                actual = attrib.get(attr)
+                if actual is None:
+                    continue
+                if attr == 'class' and value not in actual.split():
+                    continue
+                if attr != 'class' and actual != value:
+                    continue
+            if slot in ATTRIBUTE_SLOTS:
+                self.found[slot] = attrib.get(ATTRIBUTE_SLOTS[slot])
+            else:
+                self.open[slot] = (self.depth, [])
+
+    def end(self, tag: str):
+        if tag in SKIP_TEXT_TAGS:
+            self.skip_depth -= 1
+        for slot, (depth, parts) in list(self.open.items()):
+            if depth == self.depth:
+                self.found[slot] = ''.join(parts)
+                del self.open[slot]
+        self.depth -= 1
+        if not self.open and len(self.found) == len(self.matchers):
+            raise StopParsing()
+
+    def data(self, text: str):
+        if self.skip_depth:
+            return
+        for _, parts in self.open.values():
+            parts.append(text)
+
+    def close(self) -> Dict[str, Optional[str]]:
+        # Elements still open at EOF count with the text seen so far
+        for slot, (_, parts) in self.open.items():
+            self.found[slot] = ''.join(parts)
+        self.open = {}
+        return self.found
+
+
+def detect_charset(content: bytes) -> str:
+    """Charset declared in the page's meta tags, defaulting to UTF-8"""
+    match = CHARSET_PATTERN.search(content, 0, 4096)
+    if match:
+        charset = match.group(1).decode('ascii', 'ignore').lower()
+        try:
+            ''.encode(charset)
+            return charset
+        except LookupError:
+            pass
+    return 'utf-8'
+
+
+def collect(content: bytes, matchers: List[Matcher], stop_at_body: bool) -> Dict[str, Optional[str]]:
+    """Feed the page through the collector and return what each slot matched"""
+    collector = TitleCollector(matchers, stop_at_body)
+    parser = etree.HTMLParser(target=collector, encoding=detect_charset(content))
+    try:
+        parser.feed(content)
+        return parser.close()
+    except StopParsing:
+        return collector.close()
+
+
+def extract_title_candidates(content: bytes, url_domain: str, deep: bool = True) -> List[str]:
+    """Collect title candidates in the same order as TitleCleaner's BeautifulSoup lookups"""
+    site = site_for_domain(url_domain) if deep else None
+    matchers = list(HEAD_MATCHERS)
+    if deep:
+        matchers += DEEP_MATCHERS
+        if site:
+            # The wishlink 'h1' selector shares the h1 slot already collected above
+            matchers += [m for m in SITE_MATCHERS[site] if m[0] != 'h1']
+
+    found = collect(content, matchers, stop_at_body=not deep)
+    candidates = []
+
+    for slot in ('og_title', 'twitter_title', 'title'):
+        if found.get(slot):
+            candidates.append(found[slot].strip())
+
+    if not deep:
+        return candidates
+
+    if found.get('h1'):
+        candidates.append(found['h1'].strip())
+
+    if site == 'flipkart':
+        # First of the three selectors that exists on the page, like the chained soup.find calls
+        for slot in ('B_NuCI', 'x2cTzZ', 'VU-ZEz'):
+            if slot in found:
+                if found[slot]:
+                    candidates.append(found[slot].strip())
+                break
+    elif site:
+        for slot, _, _, _ in SITE_MATCHERS[site]:
+            if found.get(slot):
+                candidates.append(found[slot].strip())
+
+    return candidates
@@ -0,0 +1,95 @@
+import os
+import logging
+from typing import TYPE_CHECKING, Awaitable, Callable, List, Optional, TypeVar
+
+from rate_limit import DomainRateLimiter
+from hedging import Hedger
+
+# aiohttp is imported with the first session, not when this module loads
+if TYPE_CHECKING:
+    import aiohttp
+    from aiohttp.abc import AbstractResolver
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+
+class HTTPClient:
+    """Long-lived pooled aiohttp client shared by the resolver and the scraper"""
+
+    def __init__(self, limit: int = 100, limit_per_host: int = 10,
+                 dns_cache_ttl: int = 300, keepalive_timeout: float = 30.0,
+                 rate_limiter: Optional[DomainRateLimiter] = None,
+                 resolver: Optional['AbstractResolver'] = None,
+                 hedger: Optional[Hedger] = None):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.dns_cache_ttl = dns_cache_ttl
+        self.keepalive_timeout = keepalive_timeout
+        self.rate_limiter = rate_limiter or DomainRateLimiter()
+        # Custom DNS resolver, used by the benchmarks to point every host at a local stand-in
+        self.resolver = resolver
+        self.hedger = hedger or Hedger()
+        # Set when traffic capture is on, see capture.py
+        self.recorder = None
+        self._session: Optional['aiohttp.ClientSession'] = None
+
+    @classmethod
+    def from_env(cls) -> 'HTTPClient':
+        """Build a client using HTTP_* environment overrides"""
+        return cls(
+            limit=int(os.environ.get('HTTP_POOL_LIMIT', 100)),
+            limit_per_host=int(os.environ.get('HTTP_POOL_LIMIT_PER_HOST', 10)),
+            dns_cache_ttl=int(os.environ.get('HTTP_DNS_CACHE_TTL', 300)),
+            keepalive_timeout=float(os.environ.get('HTTP_KEEPALIVE_TIMEOUT', 30.0)),
+            rate_limiter=DomainRateLimiter.from_env(),
+            hedger=Hedger.from_env(),
+        )
+
+    @property
+    def session(self) -> 'aiohttp.ClientSession':
+        """Return the shared session, creating it on first use inside the event loop"""
+        if self._session is None or self._session.closed:
+            import aiohttp
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                use_dns_cache=True,
+                ttl_dns_cache=self.dns_cache_ttl,
+                keepalive_timeout=self.keepalive_timeout,
+                resolver=self.resolver,
+            )
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    async def throttle(self, url: str) -> float:
+        """Wait for the per-domain rate limiter before requesting this URL"""
+        return await self.rate_limiter.acquire(url)
+
+    async def hedged(self, kind: str, url: str, attempt: Callable[[str], Awaitable[T]], default_timeout: float,
+                     user_agents: List[str], primary_agent: Optional[str] = None) -> T:
+        """Throttle, then run attempt under the domain's adaptive timeout with a budgeted hedge"""
+        await self.throttle(url)
+        return await self.hedger.run(kind, self.rate_limiter.domain_key(url), attempt, default_timeout,
+                                     user_agents, primary_agent, before_hedge=lambda: self.throttle(url))
+
+    async def close(self):
+        """Close the session and release pooled connections"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            logger.info("HTTP client closed")
+        self._session = None
+
+
+def discard_unread(response: 'aiohttp.ClientResponse'):
+    """Make sure a response whose body was not read to the end cannot stall its connection
+
+    A connection still receiving the body is closed rather than pooled. One that already
+    went back to the pool when the body arrived may have reading paused on a full buffer,
+    and would hang the next request sent over it, so the buffer is drained instead.
+    """
+    if not response.content.is_eof():
+        response.close()
+    elif response.content.exception() is None:
+        response.content.read_nowait()
@@ -0,0 +1,192 @@
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import logging
+import threading
+from typing import Dict, Optional, Tuple
+
+from cache import redis_errors
+from job_queue import PRIORITY_NAMES
+
+logger = logging.getLogger(__name__)
+
+
+class SQLiteBroker:
+    """Job table in a SQLite file, shared by an intake process and workers on the same host
+
+    Jobs are claimed by deleting them inside an immediate transaction, so each one
+    goes to exactly one worker. Lower priorities are claimed first, then oldest first.
+    Pushes and claims can wait on another process's lock, so they run in a thread.
+    """
+
+    ERRORS: Tuple[type, ...] = (sqlite3.Error,)
+
+    def __init__(self, path: str, max_depth: int = 1000, poll_interval: float = 0.2):
+        self.path = path
+        self.max_depth = max_depth
+        self.poll_interval = poll_interval
+        self.pushed = 0
+        self.popped = 0
+        self.rejected = 0
+        # One connection used from the event loop and from to_thread calls
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False, timeout=5.0)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS jobs '
+            '(id INTEGER PRIMARY KEY AUTOINCREMENT, priority INTEGER NOT NULL, '
+            'payload TEXT NOT NULL, enqueued_at REAL NOT NULL)'
+        )
+        self.conn.execute('CREATE INDEX IF NOT EXISTS jobs_order ON jobs (priority, id)')
+
+    async def push(self, priority: int, payload: Dict) -> bool:
+        """Queue a job, returning False when the table already holds max_depth jobs"""
+        return await asyncio.to_thread(self.insert, priority, json.dumps(payload))
+
+    def insert(self, priority: int, payload: str) -> bool:
+        with self.lock:
+            if self.conn.execute('SELECT COUNT(*) FROM jobs').fetchone()[0] >= self.max_depth:
+                self.rejected += 1
+                return False
+            self.conn.execute('INSERT INTO jobs (priority, payload, enqueued_at) VALUES (?, ?, ?)',
+                              (priority, payload, time.time()))
+            self.pushed += 1
+            return True
+
+    def claim(self) -> Optional[Dict]:
+        """Take the next job off the table, None when it is empty"""
+        with self.lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = self.conn.execute('SELECT id, payload FROM jobs ORDER BY priority, id LIMIT 1').fetchone()
+                if row is not None:
+                    self.conn.execute('DELETE FROM jobs WHERE id = ?', (row[0],))
+                self.conn.execute('COMMIT')
+            except BaseException:
+                self.conn.execute('ROLLBACK')
+                raise
+            if row is None:
+                return None
+            self.popped += 1
+        return json.loads(row[1])
+
+    async def pop(self, timeout: float) -> Optional[Dict]:
+        """Wait up to timeout seconds for a job"""
+        deadline = time.monotonic() + timeout
+        while True:
+            job = await asyncio.to_thread(self.claim)
+            if job is not None or time.monotonic() >= deadline:
+                return job
+            await asyncio.sleep(self.poll_interval)
+
+    def depth(self) -> int:
+        with self.lock:
+            return self.conn.execute('SELECT COUNT(*) FROM jobs').fetchone()[0]
+
+    def close(self):
+        """Close the database connection"""
+        with self.lock:
+            self.conn.close()
+
+    def stats(self) -> Dict[str, int]:
+        """Queue depth and push/pop counters as seen by this process"""
+        stats = {'depth': self.depth(), 'pushed': self.pushed, 'popped': self.popped, 'rejected': self.rejected}
+        with self.lock:
+            counts = dict(self.conn.execute('SELECT priority, COUNT(*) FROM jobs GROUP BY priority').fetchall())
+        for priority, name in PRIORITY_NAMES.items():
+            stats[f'depth_{name}'] = counts.get(priority, 0)
+        return stats
+
+
+class RedisBroker:
+    """One list per priority on a Redis-compatible server, for workers on any host
+
+    Needs the optional redis package. BRPOP checks the lists in priority order,
+    so a worker always takes the most urgent job waiting. Every call runs in a
+    thread; pushes and stats use their own client with a short socket timeout,
+    so a stalled server costs the intake process a fallback, not its event loop.
+    """
+
+    def __init__(self, url: str, prefix: str = 'dealbot', max_depth: int = 1000, timeout: float = 1.0,
+                 client=None):
+        self.ERRORS = redis_errors(client)
+        if client is None:
+            import redis
+            # Blocking pops must outlive the socket timeout, they get a client without one
+            self.client = redis.Redis.from_url(url, socket_timeout=None, socket_connect_timeout=timeout)
+            self.push_client = redis.Redis.from_url(url, socket_timeout=timeout, socket_connect_timeout=timeout)
+        else:
+            self.client = self.push_client = client
+        self.max_depth = max_depth
+        self.pushed = 0
+        self.popped = 0
+        self.rejected = 0
+        self.keys = [f'{prefix}:jobs:{priority}' for priority in sorted(PRIORITY_NAMES)]
+        self.push_client.ping()
+
+    def key(self, priority: int) -> str:
+        return self.keys[min(max(priority, 0), len(self.keys) - 1)]
+
+    async def push(self, priority: int, payload: Dict) -> bool:
+        """Queue a job, returning False when the lists already hold max_depth jobs"""
+        return await asyncio.to_thread(self.insert, priority, json.dumps(payload))
+
+    def insert(self, priority: int, payload: str) -> bool:
+        if self.depth() >= self.max_depth:
+            self.rejected += 1
+            return False
+        self.push_client.lpush(self.key(priority), payload)
+        self.pushed += 1
+        return True
+
+    async def pop(self, timeout: float) -> Optional[Dict]:
+        """Wait up to timeout seconds for a job"""
+        item = await asyncio.to_thread(self.client.brpop, self.keys, max(int(timeout), 1))
+        if item is None:
+            return None
+        self.popped += 1
+        return json.loads(item[1])
+
+    def depth(self) -> int:
+        pipe = self.push_client.pipeline(transaction=False)
+        for key in self.keys:
+            pipe.llen(key)
+        return sum(pipe.execute())
+
+    def close(self):
+        """Close the connection pools"""
+        self.client.close()
+        if self.push_client is not self.client:
+            self.push_client.close()
+
+    def stats(self) -> Dict[str, int]:
+        """Queue depth and push/pop counters as seen by this process"""
+        pipe = self.push_client.pipeline(transaction=False)
+        for key in self.keys:
+            pipe.llen(key)
+        depths = pipe.execute()
+        stats = {'depth': sum(depths), 'pushed': self.pushed, 'popped': self.popped, 'rejected': self.rejected}
+        for (priority, name), depth in zip(sorted(PRIORITY_NAMES.items()), depths):
+            stats[f'depth_{name}'] = depth
+        return stats
+
+
+def broker_from_env():
+    """Job broker named by JOB_BROKER (sqlite or redis), None to process messages in-process
+
+    JOB_BROKER_TIMEOUT caps how long a Redis push may take before the message is
+    processed locally instead.
+    """
+    kind = os.environ.get('JOB_BROKER', '').lower()
+    if not kind:
+        return None
+    max_depth = int(os.environ.get('JOB_BROKER_MAX_DEPTH', 1000))
+    if kind == 'redis':
+        url = os.environ.get('JOB_BROKER_URL') or os.environ.get('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+        return RedisBroker(url, max_depth=max_depth, timeout=float(os.environ.get('JOB_BROKER_TIMEOUT', 1.0)))
+    if kind == 'sqlite':
+        return SQLiteBroker(os.environ.get('JOB_BROKER_PATH', 'jobs.db'), max_depth=max_depth)
+    raise ValueError(f"Unknown JOB_BROKER: {kind}")
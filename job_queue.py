@@ -0,0 +1,136 @@
+import time
+import heapq
+import asyncio
+import logging
+import itertools
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Lower runs first
+PRIORITY_PRIVATE = 0
+PRIORITY_GROUP = 1
+PRIORITY_BULK = 2
+
+PRIORITY_NAMES = {PRIORITY_PRIVATE: 'private', PRIORITY_GROUP: 'group', PRIORITY_BULK: 'bulk'}
+
+Job = Callable[[], Awaitable[None]]
+# (priority, sequence, enqueued_at, job, on_shed)
+Entry = Tuple[int, int, float, Job, Optional[Job]]
+
+
+class WorkQueue:
+    """Bounded priority queue drained by a fixed pool of async workers"""
+
+    def __init__(self, workers: int = 8, max_size: int = 100):
+        self.workers = workers
+        self.max_size = max_size
+        self.heap: List[Entry] = []
+        self.available: Optional[asyncio.Semaphore] = None
+        self.tasks: List[asyncio.Task] = []
+        self.sequence = itertools.count()
+        self.busy = 0
+        self.submitted = 0
+        self.shed = 0
+        self.evicted = 0
+        self.completed = 0
+        self.failed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def start(self):
+        """Start the worker tasks, must be called from the running event loop"""
+        if self.tasks:
+            return
+        self.available = asyncio.Semaphore(0)
+        self.tasks = [asyncio.create_task(self.worker(i)) for i in range(self.workers)]
+        logger.info(f"Work queue started with {self.workers} workers, capacity {self.max_size}")
+
+    async def stop(self):
+        """Cancel the workers, dropping anything still queued"""
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        self.heap = []
+
+    def submit(self, priority: int, job: Job, on_shed: Optional[Job] = None) -> bool:
+        """Queue a job, returning False when it was shed because the queue is full
+
+        A full queue makes room for a higher priority job by evicting the newest job
+        of the lowest queued priority. Whichever job is shed has its on_shed run instead.
+        """
+        if self.available is None:
+            raise RuntimeError("Work queue not started")
+
+        entry = (priority, next(self.sequence), time.monotonic(), job, on_shed)
+        if len(self.heap) >= self.max_size:
+            worst = max(range(len(self.heap)), key=lambda i: self.heap[i][:2])
+            if self.heap[worst][0] <= priority:
+                self.run_shed(entry)
+                return False
+            evicted = self.heap[worst]
+            self.heap[worst] = entry
+            heapq.heapify(self.heap)
+            self.evicted += 1
+            self.submitted += 1
+            self.run_shed(evicted)
+            return True
+
+        heapq.heappush(self.heap, entry)
+        self.submitted += 1
+        self.available.release()
+        return True
+
+    def run_shed(self, entry: Entry):
+        """Schedule the degraded handler for a job that will not be run"""
+        self.shed += 1
+        on_shed = entry[4]
+        if on_shed is not None:
+            asyncio.ensure_future(self.run_job(on_shed, 'shed handler'))
+
+    async def run_job(self, job: Job, label: str) -> bool:
+        """Await a job, logging instead of raising on failure"""
+        try:
+            await job()
+            return True
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Queue {label} failed: {e}")
+            return False
+
+    async def worker(self, index: int):
+        """Run queued jobs one at a time, highest priority first"""
+        while True:
+            await self.available.acquire()
+            _, _, enqueued_at, job, _ = heapq.heappop(self.heap)
+            wait = time.monotonic() - enqueued_at
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+            self.busy += 1
+            try:
+                if await self.run_job(job, f"worker {index} job"):
+                    self.completed += 1
+                else:
+                    self.failed += 1
+            finally:
+                self.busy -= 1
+
+    def stats(self) -> Dict[str, float]:
+        """Queue depth, throughput counters and wait times"""
+        started = self.completed + self.failed + self.busy
+        stats = {
+            'depth': len(self.heap),
+            'busy_workers': self.busy,
+            'submitted': self.submitted,
+            'shed': self.shed,
+            'evicted': self.evicted,
+            'completed': self.completed,
+            'failed': self.failed,
+            'avg_wait': self.total_wait / started if started else 0.0,
+            'max_wait': self.max_wait,
+        }
+        for priority, name in PRIORITY_NAMES.items():
+            stats[f'depth_{name}'] = sum(1 for entry in self.heap if entry[0] == priority)
+        return stats
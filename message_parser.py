@@ -0,0 +1,142 @@
+import re
+from functools import lru_cache
+from typing import List, NamedTuple, Optional, Tuple
+
+URL_PATTERN = r'https?://(?:[-\w.])+(?::[0-9]+)?(?:/(?:[\w/_.])*)?(?:\?(?:[\w&=%.])*)?(?:#(?:[\w.])*)?'
+
+# One pass over the message picks out every token the extractors care about.
+# URLs come first so nothing inside a link is read as a price, PIN or marker.
+TOKEN_PATTERN = re.compile(
+    rf'(?P<url>{URL_PATTERN})'
+    r'|(?P<number>\d[\d,]*)'
+    r'|(?P<from>(?i:from))'
+    r'|(?P<size>(?i:size\s*-))'
+    r'|(?P<stock>(?i:stock\s*:))'
+)
+
+# A number is a price when a currency sign directly precedes or follows it: ₹1299, Rs. 1299, 1299 rs
+CURRENCY_BEFORE = re.compile(r'(?:₹|Rs?\.?\s*)\Z', re.IGNORECASE)
+CURRENCY_AFTER = re.compile(r'\s*(?:₹|r)', re.IGNORECASE)
+# How far back to look for a currency sign before a number
+CURRENCY_WINDOW = 24
+
+# Everything from the start of a link to the next whitespace
+LINK_TAIL = re.compile(r'https?://\S+')
+
+SIZE_SPEC = re.compile(r'size\s*-\s*([\w,\s]+)', re.IGNORECASE)
+STOCK_SPEC = re.compile(r'stock\s*:\s*([\w,\s]+)', re.IGNORECASE)
+
+DEFAULT_PIN = "110001"  # Delhi
+
+
+class ParsedMessage(NamedTuple):
+    """Everything the reply needs from a message's text, from a single scan"""
+    text: str
+    urls: Tuple[str, ...]
+    # (price, offset of the number in text), one entry per number
+    prices: Tuple[Tuple[int, int], ...]
+    pin: str
+    sizes: str
+    title_lines: Tuple[str, ...]
+    has_from: bool
+
+    @property
+    def price_values(self) -> List[int]:
+        return [price for price, _ in self.prices]
+
+    @property
+    def forwarded_title(self) -> Optional[str]:
+        """First one or two text lines, as a forwarded deal post usually starts with the title"""
+        return ' '.join(self.title_lines[:2]) if self.title_lines else None
+
+    @property
+    def message_title(self) -> str:
+        """The whole text without its links, whitespace collapsed"""
+        return ' '.join(LINK_TAIL.sub('', self.text).split())
+
+
+def is_word_char(char: str) -> bool:
+    return char.isalnum() or char == '_'
+
+
+def valid_pin(digits: str) -> bool:
+    """Six digits that are not all the same or a plain 123456/654321 run"""
+    return len(set(digits)) > 1 and not digits.startswith(('123456', '654321'))
+
+
+def pin_candidates(text: str, start: int, token: str) -> List[str]:
+    """Six-digit groups in a number token that stand alone as words"""
+    pins = []
+    offset = 0
+    groups = token.split(',')
+    for i, group in enumerate(groups):
+        if len(group) == 6 and group.isdigit():
+            # Commas inside the token already separate groups; the token's own edges need a non-word neighbour
+            before_ok = i > 0 or start == 0 or not is_word_char(text[start - 1])
+            end = start + offset + 6
+            after_ok = i < len(groups) - 1 or end >= len(text) or not is_word_char(text[end])
+            if before_ok and after_ok:
+                pins.append(group)
+        offset += len(group) + 1
+    return pins
+
+
+def size_spec(match: Optional[re.Match]) -> Optional[str]:
+    """Normalised size list from a 'Size - ...' match"""
+    if match is None:
+        return None
+    sizes = match.group(1).strip().upper()
+    if 'all' in sizes.lower():
+        return 'All'
+    return sizes.replace(' ', '')
+
+
+@lru_cache(maxsize=256)
+def parse_message(text: str) -> ParsedMessage:
+    """Scan a message once for links, prices, PIN, sizes, title lines and the 'from' marker"""
+    urls = []
+    prices = []
+    pin = None
+    sizes = None
+    stock = None
+    has_from = False
+
+    for match in TOKEN_PATTERN.finditer(text):
+        kind = match.lastgroup
+        if kind == 'url':
+            urls.append(match.group())
+        elif kind == 'number':
+            token = match.group()
+            start, end = match.span()
+            value = token.replace(',', '')
+            if int(value) > 0 and (CURRENCY_AFTER.match(text, end)
+                                   or CURRENCY_BEFORE.search(text, max(start - CURRENCY_WINDOW, 0), start)):
+                prices.append((int(value), start))
+            if pin is None:
+                pin = next((p for p in pin_candidates(text, start, token) if valid_pin(p)), None)
+        elif kind == 'from':
+            has_from = True
+        elif kind == 'size':
+            if sizes is None:
+                sizes = size_spec(SIZE_SPEC.match(text, match.start()))
+        elif stock is None:
+            spec = STOCK_SPEC.match(text, match.start())
+            if spec:
+                stock = spec.group(1).strip().upper()
+
+    title_lines = []
+    for line in text.split('\n'):
+        line = line.strip()
+        if len(line) > 5 and 'http://' not in line and 'https://' not in line:
+            title_lines.append(line)
+
+    # Cached results are shared between callers, so nothing in them is mutable
+    return ParsedMessage(
+        text=text,
+        urls=tuple(urls),
+        prices=tuple(prices),
+        pin=pin or DEFAULT_PIN,
+        sizes=sizes if sizes is not None else (stock if stock is not None else 'All'),
+        title_lines=tuple(title_lines),
+        has_from=has_from,
+    )
@@ -0,0 +1,228 @@
+import os
+import time
+import errno
+import asyncio
+import logging
+from bisect import bisect_left
+from contextlib import nullcontext
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Tuple
+
+# The endpoint's aiohttp server is only imported when a port is configured
+if TYPE_CHECKING:
+    from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+# Seconds; spans cache hits through slow retailer pages
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Cap on distinct label sets per histogram, anything beyond is folded into 'other'
+MAX_SERIES = 200
+
+NULL_TIMER = nullcontext()
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """Prometheus-style cumulative histogram family keyed by label set"""
+
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.series: Dict[LabelKey, List[float]] = {}
+
+    def observe(self, value: float, labels: LabelKey):
+        """Record one sample for a label set"""
+        series = self.series.get(labels)
+        if series is None:
+            if len(self.series) >= MAX_SERIES:
+                labels = tuple((key, 'other') for key, _ in labels)
+            series = self.series.setdefault(labels, [0] * (len(self.buckets) + 1) + [0.0])
+        # Layout: one count per bucket, the +Inf count, then the running sum
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def percentile(self, series: List[float], q: float) -> float:
+        """Estimate a percentile by interpolating inside the bucket that holds it"""
+        total = sum(series[:-1])
+        if not total:
+            return 0.0
+        rank = q * total
+        seen = 0
+        lower = 0.0
+        for i, count in enumerate(series[:-1]):
+            if seen + count >= rank and count:
+                upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+            lower = self.buckets[i] if i < len(self.buckets) else lower
+        return self.buckets[-1]
+
+    def render(self) -> List[str]:
+        """Prometheus text exposition lines for this family"""
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for labels, series in sorted(self.series.items()):
+            base = ','.join(f'{key}="{escape_label(value)}"' for key, value in labels)
+            prefix = base + ',' if base else ''
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+            cumulative += series[len(self.buckets)]
+            lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{base}}} {series[-1]:.6f}')
+            lines.append(f'{self.name}_count{{{base}}} {cumulative}')
+        return lines
+
+
+class Timer:
+    """Context manager that records its elapsed time into a histogram"""
+
+    __slots__ = ('histogram', 'labels', 'start')
+
+    def __init__(self, histogram: Histogram, labels: LabelKey):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start, self.labels)
+        return False
+
+
+def escape_label(value: str) -> str:
+    """Escape a label value for the text exposition format"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Metrics:
+    """Stage latency histograms plus gauges pulled from component stats()"""
+
+    def __init__(self, enabled: bool = False, port: Optional[int] = None, log_interval: float = 0,
+                 port_span: int = 1):
+        self.enabled = enabled
+        self.port = port
+        # Processes sharing a host each take the first free port of port .. port + span - 1
+        self.port_span = max(1, port_span)
+        self.log_interval = log_interval
+        self.histograms: Dict[str, Histogram] = {}
+        self.collectors: List[Tuple[str, Callable[[], Dict], Optional[str], bool]] = []
+        self.runner: Optional['web.AppRunner'] = None
+        self.log_task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_env(cls) -> 'Metrics':
+        """Enabled when METRICS_PORT or METRICS_LOG_INTERVAL is set"""
+        port = os.environ.get('METRICS_PORT')
+        log_interval = float(os.environ.get('METRICS_LOG_INTERVAL', 0))
+        return cls(enabled=bool(port or log_interval), port=int(port) if port else None,
+                   log_interval=log_interval, port_span=int(os.environ.get('METRICS_PORT_SPAN', 1)))
+
+    def histogram(self, name: str, help_text: str) -> Histogram:
+        """Get or create a histogram family"""
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram(name, help_text)
+        return histogram
+
+    def timer(self, name: str, **labels: str):
+        """Time a block into the named histogram; a shared no-op when metrics are off"""
+        if not self.enabled:
+            return NULL_TIMER
+        return Timer(self.histogram(name, name.replace('_', ' ')), tuple(sorted(labels.items())))
+
+    def observe(self, name: str, value: float, **labels: str):
+        """Record a sample directly"""
+        if self.enabled:
+            self.histogram(name, name.replace('_', ' ')).observe(value, tuple(sorted(labels.items())))
+
+    def add_collector(self, prefix: str, collect: Callable[[], Dict], label: Optional[str] = None,
+                      blocking: bool = False):
+        """Export a component's stats() as gauges; with label, stats() maps label values to dicts
+
+        A blocking stats() (one that does I/O, like a Redis round trip) is called from a thread.
+        """
+        self.collectors.append((prefix, collect, label, blocking))
+
+    async def render(self) -> str:
+        """Everything in Prometheus text format"""
+        lines = []
+        for histogram in self.histograms.values():
+            lines.extend(histogram.render())
+        for prefix, collect, label, blocking in self.collectors:
+            try:
+                stats = await asyncio.to_thread(collect) if blocking else collect()
+            except Exception as e:
+                logger.warning(f"Metrics collector {prefix} failed: {e}")
+                continue
+            rows = stats.items() if label else [(None, stats)]
+            for label_value, values in rows:
+                selector = f'{{{label}="{escape_label(label_value)}"}}' if label else ''
+                for key, value in values.items():
+                    if isinstance(value, (int, float)):
+                        lines.append(f"{prefix}_{key}{selector} {value}")
+        return '\n'.join(lines) + '\n'
+
+    def summary(self) -> List[str]:
+        """One line per histogram series with count and p50/p95/p99"""
+        lines = []
+        for histogram in self.histograms.values():
+            for labels, series in sorted(histogram.series.items()):
+                count = int(sum(series[:-1]))
+                label_text = ' '.join(f"{key}={value}" for key, value in labels)
+                p50, p95, p99 = (histogram.percentile(series, q) * 1000 for q in (0.5, 0.95, 0.99))
+                lines.append(f"{histogram.name} {label_text} n={count} "
+                             f"p50={p50:.0f}ms p95={p95:.0f}ms p99={p99:.0f}ms")
+        return lines
+
+    async def handle_metrics(self, request: 'web.Request') -> 'web.Response':
+        from aiohttp import web
+        return web.Response(text=await self.render(), content_type='text/plain', charset='utf-8')
+
+    async def log_summary(self):
+        """Periodically log the latency summary"""
+        while True:
+            await asyncio.sleep(self.log_interval)
+            for line in self.summary():
+                logger.info(line)
+
+    async def start(self):
+        """Start the HTTP endpoint and/or the periodic log summary"""
+        if self.port:
+            from aiohttp import web
+            app = web.Application()
+            app.router.add_get('/metrics', self.handle_metrics)
+            self.runner = web.AppRunner(app, access_log=None)
+            await self.runner.setup()
+            for port in range(self.port, self.port + self.port_span):
+                try:
+                    await web.TCPSite(self.runner, '0.0.0.0', port).start()
+                except OSError as e:
+                    if e.errno != errno.EADDRINUSE:
+                        raise
+                    continue
+                self.port = port
+                logger.info(f"Metrics endpoint listening on :{port}/metrics")
+                break
+            else:
+                # Another process on this host holds every port, run without the endpoint
+                logger.warning(f"Metrics ports {self.port}-{self.port + self.port_span - 1} are all in use, "
+                               f"not serving /metrics")
+                await self.runner.cleanup()
+                self.runner = None
+        if self.log_interval:
+            self.log_task = asyncio.create_task(self.log_summary())
+
+    async def stop(self):
+        """Stop the endpoint and the log task"""
+        if self.log_task is not None:
+            self.log_task.cancel()
+            self.log_task = None
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
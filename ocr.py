@@ -0,0 +1,134 @@
+import io
+import os
+import asyncio
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Optional
+
+from cache import TieredCache
+
+logger = logging.getLogger(__name__)
+
+# Longest side after downscaling; phone screenshots stay legible and OCR time stays bounded
+MAX_SIDE = 1600
+# Grayscale level above which a pixel becomes white
+THRESHOLD = 150
+
+
+def ocr_image(data: bytes) -> str:
+    """Worker process entry point: downscale, grayscale, threshold and run Tesseract"""
+    # Imported here so only the worker processes pay for them
+    from PIL import Image, ImageOps
+    import pytesseract
+
+    try:
+        image = Image.open(io.BytesIO(data))
+        image.thumbnail((MAX_SIDE, MAX_SIDE))
+        image = ImageOps.autocontrast(ImageOps.grayscale(image))
+        image = image.point(lambda level: 255 if level > THRESHOLD else 0)
+        return pytesseract.image_to_string(image)
+    except Exception as e:
+        # Some pytesseract errors cannot be pickled back to the parent, which breaks the pool
+        raise RuntimeError(f"{type(e).__name__}: {e}") from None
+
+
+class PhotoOCR:
+    """Tesseract OCR for photo-only messages on a bounded process pool, cached per photo"""
+
+    def __init__(self, cache: TieredCache, workers: int = 2, max_pending: int = 8, timeout: float = 30.0):
+        self.cache = cache
+        self.workers = workers
+        self.timeout = timeout
+        self.slots = asyncio.Semaphore(max_pending)
+        self.pool: Optional[ProcessPoolExecutor] = None
+        self.requests = 0
+        self.cache_hits = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.pending = 0
+
+    @classmethod
+    def from_env(cls) -> 'PhotoOCR':
+        """Build from OCR_WORKERS (0 disables OCR) and OCR_MAX_PENDING"""
+        return cls(
+            cache=TieredCache.from_env('photo_text', ttl=30 * 86400),
+            workers=int(os.environ.get('OCR_WORKERS', 2)),
+            max_pending=int(os.environ.get('OCR_MAX_PENDING', 8)),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.workers > 0
+
+    async def photo_text(self, photo) -> str:
+        """OCR text of a Telegram PhotoSize, empty when nothing could be read"""
+        self.requests += 1
+        # file_unique_id is stable across chats and reposts of the same image
+        cached = await self.cache.aget(photo.file_unique_id)
+        if cached is not None:
+            self.cache_hits += 1
+            return cached
+
+        try:
+            file = await photo.get_file()
+            data = bytes(await file.download_as_bytearray())
+            text = await self.run(data)
+        except Exception as e:
+            self.failures += 1
+            logger.warning(f"OCR failed for photo {photo.file_unique_id}: {e}")
+            return ""
+
+        await self.cache.aset(photo.file_unique_id, text)
+        return text
+
+    async def run(self, data: bytes) -> str:
+        """Run ocr_image on the pool, queueing at most max_pending images
+
+        Timing out (or being cancelled) cannot stop Tesseract once a worker has the
+        image, so the slot is held until the pool really finishes with it.
+        """
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(max_workers=self.workers)
+        await self.slots.acquire()
+        self.pending += 1
+        try:
+            future = asyncio.get_running_loop().run_in_executor(self.pool, ocr_image, data)
+        except BaseException:
+            self.release(None)
+            raise
+        future.add_done_callback(self.release)
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise
+        except BrokenProcessPool:
+            # A crashed worker (e.g. out of memory on a huge image) poisons the pool, start afresh
+            self.pool = None
+            raise
+
+    def release(self, future: Optional[asyncio.Future]):
+        """Free an image's slot once the pool is done with it"""
+        self.pending -= 1
+        self.slots.release()
+        # Nobody awaits an image that timed out, keep its result or error quiet
+        if future is not None and not future.cancelled():
+            future.exception()
+
+    def close(self):
+        """Stop the worker processes and close the cache"""
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+        self.cache.close()
+
+    def stats(self) -> Dict[str, int]:
+        """Lookups, cache hits, failures, timeouts and images waiting for or in OCR"""
+        return {
+            'requests': self.requests,
+            'cache_hits': self.cache_hits,
+            'failures': self.failures,
+            'timeouts': self.timeouts,
+            'pending': self.pending,
+        }
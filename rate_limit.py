@@ -0,0 +1,129 @@
+import os
+import time
+import asyncio
+import logging
+from urllib.parse import urlparse
+from typing import Optional, Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Token bucket that hands out reservations in arrival order"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.waiting = 0
+        self.acquired = 0
+        self.delayed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def reserve(self) -> float:
+        """Take a token and return how long the caller must wait for it"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        self.acquired += 1
+        if self.tokens >= 0:
+            return 0.0
+        # Tokens below zero are reservations already promised to earlier callers
+        return -self.tokens / self.rate
+
+
+class DomainRateLimiter:
+    """Per-domain token-bucket scheduler for outbound requests"""
+
+    # domain: (requests per second, burst)
+    DEFAULT_LIMITS = {
+        'amazon.in': (2.0, 4),
+        'flipkart.com': (2.0, 4),
+        'meesho.com': (2.0, 4),
+        'myntra.com': (2.0, 4),
+        'ajio.com': (2.0, 4),
+    }
+
+    def __init__(self, limits: Optional[Dict[str, Tuple[float, int]]] = None,
+                 default_limit: Tuple[float, int] = (5.0, 10)):
+        self.limits = dict(self.DEFAULT_LIMITS if limits is None else limits)
+        self.default_limit = default_limit
+        self.buckets: Dict[str, TokenBucket] = {}
+
+    @classmethod
+    def from_env(cls) -> 'DomainRateLimiter':
+        """Build a limiter, applying DOMAIN_RATE_LIMITS overrides like 'amazon.in=2:4,flipkart.com=1:2'"""
+        limits = dict(cls.DEFAULT_LIMITS)
+        for item in os.environ.get('DOMAIN_RATE_LIMITS', '').split(','):
+            if '=' not in item:
+                continue
+            domain, spec = item.split('=', 1)
+            rate, _, burst = spec.partition(':')
+            try:
+                limits[domain.strip().lower()] = (float(rate), int(burst or 1))
+            except ValueError:
+                logger.warning(f"Ignoring bad rate limit entry: {item}")
+        return cls(limits)
+
+    def share(self, workers: int):
+        """Split every limit evenly between this many worker processes hitting the same sites"""
+        if workers <= 1:
+            return
+        self.limits = {domain: (rate / workers, max(1, burst // workers))
+                       for domain, (rate, burst) in self.limits.items()}
+        rate, burst = self.default_limit
+        self.default_limit = (rate / workers, max(1, burst // workers))
+        self.buckets = {}
+
+    def domain_key(self, url: str) -> str:
+        """Map a URL to the configured domain it falls under, or its host"""
+        host = urlparse(url).netloc.lower().split(':')[0]
+        for domain in self.limits:
+            if host == domain or host.endswith('.' + domain):
+                return domain
+        return host
+
+    def bucket(self, key: str) -> TokenBucket:
+        """Return the bucket for a domain key, creating it on first use"""
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            rate, burst = self.limits.get(key, self.default_limit)
+            bucket = self.buckets[key] = TokenBucket(rate, burst)
+        return bucket
+
+    async def acquire(self, url: str) -> float:
+        """Wait until a request to this URL's domain is allowed, return the time waited"""
+        bucket = self.bucket(self.domain_key(url))
+        wait = bucket.reserve()
+        if wait <= 0:
+            return 0.0
+
+        bucket.waiting += 1
+        bucket.delayed += 1
+        try:
+            await asyncio.sleep(wait)
+        except asyncio.CancelledError:
+            # Hand the reserved slot back so later callers are not delayed for nothing
+            bucket.tokens += 1
+            raise
+        finally:
+            bucket.waiting -= 1
+        bucket.total_wait += wait
+        bucket.max_wait = max(bucket.max_wait, wait)
+        return wait
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Queue depth and wait times per domain"""
+        return {
+            key: {
+                'queue_depth': bucket.waiting,
+                'acquired': bucket.acquired,
+                'delayed': bucket.delayed,
+                'avg_wait': bucket.total_wait / bucket.delayed if bucket.delayed else 0.0,
+                'max_wait': bucket.max_wait,
+            }
+            for key, bucket in self.buckets.items()
+        }
@@ -0,0 +1,195 @@
+import re
+from urllib.parse import urlparse, parse_qs, unquote, urlencode, ParseResult
+from typing import List, NamedTuple, Optional
+
+
+class URLAnalysis(NamedTuple):
+    """What a retailer URL says about its product without fetching it"""
+    retailer: str
+    product_id: str
+    canonical_url: str
+    title: Optional[str]
+    # 0..1, how likely title alone names the product well enough to skip scraping
+    confidence: float
+
+    @property
+    def product_key(self) -> str:
+        return f"{self.retailer}:{self.product_id}"
+
+
+SLUG_SPLIT = re.compile(r'[-_+]+')
+WORD_PATTERN = re.compile(r'[A-Za-z]{2,}')
+
+
+def slug_title(slug: str) -> Optional[str]:
+    """Readable title from a URL slug, capitalising all-lowercase words"""
+    words = [word for word in SLUG_SPLIT.split(unquote(slug)) if word]
+    if not words:
+        return None
+    return ' '.join(word.capitalize() if word.islower() else word for word in words)
+
+
+def slug_confidence(title: Optional[str]) -> float:
+    """Confidence from how many real words the slug title has"""
+    if not title:
+        return 0.0
+    words = sum(1 for word in title.split() if WORD_PATTERN.fullmatch(word))
+    return {0: 0.0, 1: 0.3, 2: 0.6}.get(words, 0.9)
+
+
+def path_segments(parsed: ParseResult) -> List[str]:
+    return [segment for segment in parsed.path.split('/') if segment]
+
+
+class RetailerAnalyzer:
+    """Base analyzer, subclasses handle one retailer's URL layout"""
+
+    name = ''
+    domains: tuple = ()
+
+    def matches(self, host: str) -> bool:
+        return any(host == domain or host.endswith('.' + domain) for domain in self.domains)
+
+    def analyze(self, parsed: ParseResult, host: str) -> Optional[URLAnalysis]:
+        raise NotImplementedError
+
+    @staticmethod
+    def origin(parsed: ParseResult, host: str) -> str:
+        return f"{parsed.scheme or 'https'}://{host}"
+
+    def result(self, product_id: str, canonical_url: str, slug: Optional[str]) -> URLAnalysis:
+        title = slug_title(slug) if slug else None
+        return URLAnalysis(self.name, product_id, canonical_url, title, slug_confidence(title))
+
+
+class AmazonAnalyzer(RetailerAnalyzer):
+    """/<slug>/dp/<ASIN>, /dp/<ASIN>, /gp/product/<ASIN> and /gp/aw/d/<ASIN>"""
+
+    name = 'amazon'
+    ASIN = re.compile(r'[A-Z0-9]{10}', re.IGNORECASE)
+
+    def matches(self, host: str) -> bool:
+        return host.startswith('amazon.') or '.amazon.' in host
+
+    def analyze(self, parsed: ParseResult, host: str) -> Optional[URLAnalysis]:
+        segments = path_segments(parsed)
+        for i, segment in enumerate(segments[:-1]):
+            marker = segment.lower()
+            previous = segments[i - 1].lower() if i else ''
+            if marker == 'dp' or (marker, previous) in (('product', 'gp'), ('d', 'aw')):
+                asin = segments[i + 1]
+                if not self.ASIN.fullmatch(asin):
+                    continue
+                asin = asin.upper()
+                slug = segments[i - 1] if marker == 'dp' and i else None
+                return self.result(asin, f"{self.origin(parsed, host)}/dp/{asin}", slug)
+        return None
+
+
+class FlipkartAnalyzer(RetailerAnalyzer):
+    """/<slug>/p/<itm id>?pid=<PID>"""
+
+    name = 'flipkart'
+    domains = ('flipkart.com',)
+    ITEM = re.compile(r'itm[0-9a-z]+', re.IGNORECASE)
+    # Kept on the canonical URL: lid picks the seller listing, marketplace=GROCERY is needed to open grocery pages
+    OFFER_PARAMS = ('lid', 'marketplace')
+
+    def analyze(self, parsed: ParseResult, host: str) -> Optional[URLAnalysis]:
+        segments = path_segments(parsed)
+        params = parse_qs(parsed.query)
+        pid = params.get('pid', [''])[0]
+        for i, segment in enumerate(segments[:-1]):
+            if segment == 'p' and self.ITEM.fullmatch(segments[i + 1]):
+                item = segments[i + 1].lower()
+                slug = segments[i - 1] if i else None
+                path = f"/{slug}/p/{item}" if slug else f"/p/{item}"
+                # dl.flipkart.com app links carry the same product path as the site
+                origin = self.origin(parsed, 'www.flipkart.com' if host == 'dl.flipkart.com' else host)
+                query = [('pid', pid)] if pid else []
+                query += [(name, params[name][0]) for name in self.OFFER_PARAMS if name in params]
+                canonical = origin + path + (f"?{urlencode(query)}" if query else '')
+                return self.result(pid.upper() if pid else item, canonical, slug)
+        return None
+
+
+class MeeshoAnalyzer(RetailerAnalyzer):
+    """/<slug>/p/<id>"""
+
+    name = 'meesho'
+    domains = ('meesho.com',)
+    PRODUCT = re.compile(r'[0-9a-z]+', re.IGNORECASE)
+
+    def analyze(self, parsed: ParseResult, host: str) -> Optional[URLAnalysis]:
+        segments = path_segments(parsed)
+        for i, segment in enumerate(segments[:-1]):
+            if segment == 'p' and self.PRODUCT.fullmatch(segments[i + 1]):
+                product = segments[i + 1].lower()
+                slug = segments[i - 1] if i else None
+                path = f"/{slug}/p/{product}" if slug else f"/p/{product}"
+                return self.result(product, self.origin(parsed, host) + path, slug)
+        return None
+
+
+class MyntraAnalyzer(RetailerAnalyzer):
+    """/<category>/<brand>/<slug>/<id>/buy"""
+
+    name = 'myntra'
+    domains = ('myntra.com',)
+
+    def analyze(self, parsed: ParseResult, host: str) -> Optional[URLAnalysis]:
+        segments = path_segments(parsed)
+        if segments and segments[-1] == 'buy':
+            segments = segments[:-1]
+        if len(segments) < 2 or not segments[-1].isdigit():
+            return None
+        product = segments[-1]
+        slug = segments[-2]
+        return self.result(product, f"{self.origin(parsed, host)}/{'/'.join(segments)}/buy", slug)
+
+
+class AjioAnalyzer(RetailerAnalyzer):
+    """/<slug>/p/<id>_<colour>"""
+
+    name = 'ajio'
+    domains = ('ajio.com',)
+    PRODUCT = re.compile(r'[0-9]+(?:_[a-z]+)?', re.IGNORECASE)
+
+    def analyze(self, parsed: ParseResult, host: str) -> Optional[URLAnalysis]:
+        segments = path_segments(parsed)
+        for i, segment in enumerate(segments[:-1]):
+            if segment == 'p' and self.PRODUCT.fullmatch(segments[i + 1]):
+                product = segments[i + 1].lower()
+                slug = segments[i - 1] if i else None
+                path = f"/{slug}/p/{product}" if slug else f"/p/{product}"
+                return self.result(product, self.origin(parsed, host) + path, slug)
+        return None
+
+
+ANALYZERS: List[RetailerAnalyzer] = [
+    AmazonAnalyzer(),
+    FlipkartAnalyzer(),
+    MeeshoAnalyzer(),
+    MyntraAnalyzer(),
+    AjioAnalyzer(),
+]
+
+
+def register(analyzer: RetailerAnalyzer):
+    """Add an analyzer, consulted before the built-in ones"""
+    ANALYZERS.insert(0, analyzer)
+
+
+def analyze_url(url: str) -> Optional[URLAnalysis]:
+    """Analysis from the first analyzer that recognises url, None for unknown URLs"""
+    try:
+        parsed = urlparse(url)
+    except ValueError:
+        return None
+    host = parsed.netloc.lower().split(':')[0]
+    for analyzer in ANALYZERS:
+        if analyzer.matches(host):
+            analysis = analyzer.analyze(parsed, host)
+            if analysis is not None:
+                return analysis
+    return None
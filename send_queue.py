@@ -0,0 +1,218 @@
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from datetime import timedelta
+from typing import TYPE_CHECKING, Deque, Dict, List, Optional
+
+from rate_limit import TokenBucket
+from metrics import NULL_TIMER
+
+if TYPE_CHECKING:
+    from telegram.error import RetryAfter
+
+logger = logging.getLogger(__name__)
+
+# Telegram's cap on a text message
+MAX_MESSAGE_LENGTH = 4096
+
+
+class OutgoingReply:
+    """One reply waiting in a chat's outbox"""
+
+    __slots__ = ('message', 'text', 'photo', 'future', 'enqueued_at')
+
+    def __init__(self, message, text: str, photo: bool, future: asyncio.Future):
+        self.message = message
+        self.text = text
+        self.photo = photo
+        self.future = future
+        self.enqueued_at = time.monotonic()
+
+
+class SendScheduler:
+    """Per-chat FIFO outbox for Telegram replies, kept under per-chat and global flood limits
+
+    Each chat with pending replies gets one drain task, so replies to a chat go out in
+    the order they were queued. Every send takes a token from the chat's bucket (private
+    or group rate) and from the global bucket. A RetryAfter from Telegram pauses the chat
+    for the time it asks and the send is retried instead of failing. With a merge window,
+    text replies to the same message queued together go out as one message.
+    """
+
+    SEND_SECONDS = 'dealbot_send_seconds'
+    QUEUE_SECONDS = 'dealbot_send_queue_seconds'
+
+    # Buckets of idle chats are dropped beyond this many
+    MAX_IDLE_BUCKETS = 10000
+
+    def __init__(self, global_rate: float = 25.0, global_burst: int = 30,
+                 private_rate: float = 1.0, private_burst: int = 3,
+                 group_rate: float = 1 / 3, group_burst: int = 3,
+                 merge_window: float = 0.0, max_retries: int = 3, metrics=None):
+        self.global_bucket = TokenBucket(global_rate, global_burst)
+        self.private_limit = (private_rate, private_burst)
+        self.group_limit = (group_rate, group_burst)
+        self.merge_window = merge_window
+        self.max_retries = max_retries
+        self.metrics = metrics
+        self.outboxes: Dict[int, Deque[OutgoingReply]] = {}
+        self.drains: Dict[int, asyncio.Task] = {}
+        self.buckets: Dict[int, TokenBucket] = {}
+        self.queued = 0
+        self.sent = 0
+        self.merged = 0
+        self.retried = 0
+        self.failed = 0
+        self.throttle_wait = 0.0
+
+    @classmethod
+    def from_env(cls, metrics=None) -> 'SendScheduler':
+        """Build from SEND_GLOBAL_RATE, SEND_CHAT_RATE, SEND_GROUP_RATE (per second),
+        SEND_MERGE_WINDOW (seconds, 0 sends every reply on its own) and SEND_MAX_RETRIES"""
+        return cls(
+            global_rate=float(os.environ.get('SEND_GLOBAL_RATE', 25.0)),
+            private_rate=float(os.environ.get('SEND_CHAT_RATE', 1.0)),
+            group_rate=float(os.environ.get('SEND_GROUP_RATE', 1 / 3)),
+            merge_window=float(os.environ.get('SEND_MERGE_WINDOW', 0.0)),
+            max_retries=int(os.environ.get('SEND_MAX_RETRIES', 3)),
+            metrics=metrics,
+        )
+
+    @staticmethod
+    def chat_id(message) -> int:
+        return message.chat_id
+
+    def submit(self, message, text: str, photo: bool = False) -> asyncio.Future:
+        """Queue a reply to message, resolved once it is sent or has finally failed"""
+        chat_id = self.chat_id(message)
+        future = asyncio.get_running_loop().create_future()
+        self.outboxes.setdefault(chat_id, deque()).append(OutgoingReply(message, text, photo, future))
+        self.queued += 1
+        if chat_id not in self.drains:
+            self.drains[chat_id] = asyncio.create_task(self.drain(chat_id))
+        return future
+
+    async def send(self, message, text: str, photo: bool = False):
+        """Queue a reply and wait until it is delivered"""
+        await self.submit(message, text, photo)
+
+    async def drain(self, chat_id: int):
+        """Send a chat's queued replies in order, merging text replies inside the window"""
+        outbox = self.outboxes[chat_id]
+        batch: List[OutgoingReply] = []
+        try:
+            while outbox:
+                # Give replies still being produced for this chat a chance to join the batch
+                if self.merge_window and not outbox[0].photo and len(outbox) == 1:
+                    await asyncio.sleep(self.merge_window)
+                batch = [outbox.popleft()]
+                if self.merge_window and not batch[0].photo:
+                    length = len(batch[0].text)
+                    # Only replies to the same message share it, in a group each is quoted under its sender
+                    while (outbox and not outbox[0].photo
+                           and outbox[0].message.message_id == batch[0].message.message_id
+                           and length + 2 + len(outbox[0].text) <= MAX_MESSAGE_LENGTH):
+                        length += 2 + len(outbox[0].text)
+                        batch.append(outbox.popleft())
+                await self.deliver(chat_id, batch)
+        finally:
+            # Cancelled mid-deliver, the batch already taken off the outbox would never resolve
+            for reply in list(batch) + list(outbox):
+                if not reply.future.done():
+                    reply.future.cancel()
+            del self.outboxes[chat_id]
+            del self.drains[chat_id]
+            if len(self.buckets) > self.MAX_IDLE_BUCKETS:
+                self.buckets = {key: bucket for key, bucket in self.buckets.items() if key in self.drains}
+
+    def bucket(self, chat_id: int) -> TokenBucket:
+        """Flood bucket for a chat; group and channel ids are negative"""
+        bucket = self.buckets.get(chat_id)
+        if bucket is None:
+            rate, burst = self.group_limit if chat_id < 0 else self.private_limit
+            bucket = self.buckets[chat_id] = TokenBucket(rate, burst)
+        return bucket
+
+    async def throttle(self, chat_id: int):
+        """Wait for a token from both the chat's bucket and the global bucket"""
+        wait = max(self.bucket(chat_id).reserve(), self.global_bucket.reserve())
+        if wait > 0:
+            self.throttle_wait += wait
+            await asyncio.sleep(wait)
+
+    async def deliver(self, chat_id: int, batch: List[OutgoingReply]):
+        """Send one batch as a single message, sleeping through RetryAfter up to max_retries times"""
+        from telegram.error import RetryAfter
+        first = batch[0]
+        text = '\n\n'.join(reply.text for reply in batch)
+        self.merged += len(batch) - 1
+        error: Optional[BaseException] = None
+        for _ in range(self.max_retries + 1):
+            await self.throttle(chat_id)
+            try:
+                if first.photo:
+                    with self.timer('photo'):
+                        await first.message.reply_photo(photo=first.message.photo[-1].file_id, caption=text)
+                else:
+                    with self.timer('text'):
+                        await first.message.reply_text(text)
+            except RetryAfter as e:
+                error = e
+                delay = retry_seconds(e)
+                self.retried += 1
+                logger.warning(f"Telegram flood control on chat {chat_id}, retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                continue
+            except Exception as e:
+                error = e
+                break
+            self.sent += 1
+            now = time.monotonic()
+            for reply in batch:
+                if self.metrics is not None:
+                    self.metrics.observe(self.QUEUE_SECONDS, now - reply.enqueued_at)
+                if not reply.future.done():
+                    reply.future.set_result(None)
+            return
+
+        self.failed += len(batch)
+        logger.error(f"Failed to send {len(batch)} replies to chat {chat_id}: {error}")
+        for reply in batch:
+            if not reply.future.done():
+                reply.future.set_exception(error)
+                # Nobody may be waiting on a reply queued without await, keep that quiet
+                reply.future.exception()
+
+    def timer(self, kind: str):
+        if self.metrics is None:
+            return NULL_TIMER
+        return self.metrics.timer(self.SEND_SECONDS, kind=kind)
+
+    async def close(self):
+        """Stop every drain task, cancelling replies still queued"""
+        for task in list(self.drains.values()):
+            task.cancel()
+        await asyncio.gather(*self.drains.values(), return_exceptions=True)
+
+    def stats(self) -> Dict[str, float]:
+        """Outbox depth and send counters"""
+        return {
+            'depth': sum(len(outbox) for outbox in self.outboxes.values()),
+            'active_chats': len(self.drains),
+            'queued': self.queued,
+            'sent': self.sent,
+            'merged': self.merged,
+            'retried': self.retried,
+            'failed': self.failed,
+            'throttle_wait': self.throttle_wait,
+        }
+
+
+def retry_seconds(error: 'RetryAfter') -> float:
+    """Seconds Telegram asked to wait, whichever type this library version reports it in"""
+    retry_after = error.retry_after
+    if isinstance(retry_after, timedelta):
+        return retry_after.total_seconds()
+    return float(retry_after)
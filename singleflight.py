@@ -0,0 +1,34 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+
+class SingleFlight:
+    """Coalesce concurrent calls for the same key onto one in-flight task"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.inflight: Dict[str, asyncio.Task] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        """Run fn for this key, or await the result of a call already in progress"""
+        self.calls += 1
+        task = self.inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            task = asyncio.ensure_future(fn())
+            self.inflight[key] = task
+            task.add_done_callback(lambda _: self.inflight.pop(key, None))
+        # Shielded so one caller giving up does not cancel the fetch for the others
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict[str, int]:
+        """Call counts and how many were served by another caller's fetch"""
+        return {'calls': self.calls, 'coalesced': self.coalesced, 'in_flight': len(self.inflight)}
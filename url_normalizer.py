@@ -0,0 +1,97 @@
+import re
+from functools import lru_cache
+from urllib.parse import unquote_plus
+from typing import FrozenSet, Iterable, Iterator, List, NamedTuple, Optional
+
+TRACKING_PARAMS = frozenset([
+    'tag', 'ref', 'refRID', 'pf_rd_r', 'pf_rd_p', 'pf_rd_m',
+    'pf_rd_t', 'pf_rd_s', 'pf_rd_i', 'utm_source', 'utm_medium',
+    'utm_campaign', 'utm_term', 'utm_content', 'gclid', 'fbclid',
+    'mc_cid', 'mc_eid', '_gl', 'igshid', 'si'
+])
+
+# Any utm_* parameter, including ones not listed above such as utm_id
+TRACKING_PREFIXES = ('utm_',)
+
+
+class RetailerRule(NamedTuple):
+    """Extra parameters to strip, and a path suffix to drop, for one retailer"""
+    params: FrozenSet[str]
+    path_suffix: Optional[re.Pattern] = None
+
+
+# Host substring: rule
+RETAILER_RULES = {
+    'amazon.': RetailerRule(
+        frozenset([
+            'linkCode', 'linkId', 'ascsubtag', 'creative', 'creativeASIN', 'camp', 'crid',
+            'dib', 'dib_tag', 'keywords', 'qid', 'sprefix', 'sr', 'content-id', 'ref_',
+            'pd_rd_w', 'pd_rd_r', 'pd_rd_wg', 'pd_rd_i', 'pd_rd_p', 'sp_csd', 'spLa',
+        ]),
+        # /dp/B0XXXXXXXX/ref=sr_1_3 names the search slot, not the product
+        re.compile(r'/ref=[^/]*$'),
+    ),
+    'flipkart.com': RetailerRule(frozenset([
+        # lid (seller listing) and marketplace (GROCERY pages) change what the link opens, keep them
+        'affid', 'affExtParam1', 'affExtParam2', 'otracker', 'otracker1',
+        'srno', 'fm', 'iid', 'ppt', 'ppn', 'ssid', 'store', 'spotlightTagId', 'cmpid',
+    ])),
+}
+
+NO_RULE = RetailerRule(frozenset())
+
+
+@lru_cache(maxsize=4096)
+def host_rule(host: str) -> RetailerRule:
+    """Retailer rule for a lowercased host"""
+    for marker, rule in RETAILER_RULES.items():
+        if marker in host:
+            return rule
+    return NO_RULE
+
+
+def is_tracking(pair: str, extra: FrozenSet[str]) -> bool:
+    """Whether a raw key=value query pair is a tracking parameter"""
+    key = pair.partition('=')[0]
+    if '%' in key or '+' in key:
+        key = unquote_plus(key)
+    return key in TRACKING_PARAMS or key in extra or key.startswith(TRACKING_PREFIXES)
+
+
+def normalize_url(url: str) -> str:
+    """Strip tracking parameters and retailer noise, leaving everything else byte for byte
+
+    The query is filtered pair by pair without being decoded, so repeated parameters,
+    their order and their original percent-encoding all survive.
+    """
+    base, _, fragment = url.partition('#')
+    address, _, query = base.partition('?')
+
+    scheme_end = address.find('://')
+    host_start = scheme_end + 3 if scheme_end >= 0 else 0
+    host_end = address.find('/', host_start)
+    host = address[host_start:] if host_end < 0 else address[host_start:host_end]
+    rule = host_rule(host.rpartition('@')[2].partition(':')[0].lower())
+
+    if rule.path_suffix is not None and host_end >= 0:
+        address = address[:host_end] + rule.path_suffix.sub('', address[host_end:])
+
+    if query:
+        query = '&'.join(pair for pair in query.split('&') if pair and not is_tracking(pair, rule.params))
+    if query:
+        address = f"{address}?{query}"
+    if fragment:
+        address = f"{address}#{fragment}"
+    return address
+
+
+def normalize_urls(urls: Iterable[str]) -> Iterator[str]:
+    """Lazily normalize any iterable of URLs, e.g. lines streamed from a file"""
+    for url in urls:
+        yield normalize_url(url)
+
+
+def normalize_batch(urls: List[str]) -> List[str]:
+    """Normalize a list of URLs, normalizing each distinct URL once"""
+    seen = {}
+    return [seen[url] if url in seen else seen.setdefault(url, normalize_url(url)) for url in urls]